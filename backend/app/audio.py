@@ -0,0 +1,226 @@
+import shutil
+import subprocess
+import tempfile
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+
+# Whisper resamples everything to 16 kHz mono internally, so sending more is wasted upload
+TARGET_SAMPLE_RATE = 16000
+
+# Energy-based VAD settings
+FRAME_MS = 30           # Analysis frame length
+SILENCE_FLOOR_DB = -60.0  # Frames quieter than this (dBFS) are always silence
+NOISE_MARGIN_DB = 10.0    # Speech rises at least this far above the recording's noise floor...
+RELATIVE_DB = 30.0        # ...or comes within this of its loud frames
+MIN_SILENCE_MS = 700    # Only drop silent spans at least this long
+KEEP_SILENCE_MS = 200   # Padding left around speech so words aren't clipped
+RMS_CHUNK_FRAMES = 4096 # Frames converted to float at a time (bounds VAD memory on long lectures)
+
+# Re-encoding settings (mono speech stays intelligible at low bitrates)
+OUTPUT_FORMAT = "mp3"
+OUTPUT_BITRATE = "32k"
+
+
+def ffmpeg_available() -> bool:
+    """Returns True if an ffmpeg binary is on PATH."""
+    return shutil.which("ffmpeg") is not None
+
+
+def decode_to_pcm(audio_bytes: bytes, sample_rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """
+    Decodes any container/codec ffmpeg understands into mono 16-bit PCM.
+
+    The upload is written to a temporary file rather than piped: MP4/M4A
+    recordings from phones keep their index (moov atom) at the end of the
+    file, which ffmpeg can only reach by seeking.
+
+    Args:
+        audio_bytes: Raw uploaded audio file bytes
+        sample_rate: Output sample rate in Hz
+
+    Returns:
+        int16 NumPy array of mono samples
+
+    Raises:
+        ValueError: If ffmpeg produced no audio (unreadable or truncated file)
+    """
+    with tempfile.NamedTemporaryFile(suffix=".audio") as source:
+        source.write(audio_bytes)
+        source.flush()
+        result = subprocess.run(
+            [
+                "ffmpeg", "-hide_banner", "-loglevel", "error",
+                "-i", source.name,
+                "-f", "s16le", "-acodec", "pcm_s16le",
+                "-ac", "1", "-ar", str(sample_rate),
+                "pipe:1",
+            ],
+            capture_output=True,
+            check=True,
+        )
+
+    samples = np.frombuffer(result.stdout, dtype=np.int16)
+    if len(samples) == 0:
+        # ffmpeg can exit 0 on a file it couldn't read ("partial file")
+        stderr = result.stderr.decode("utf-8", errors="ignore").strip()
+        raise ValueError(f"ffmpeg decoded no audio{': ' + stderr if stderr else ''}")
+    return samples
+
+
+def trim_silence(samples: np.ndarray, sample_rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """
+    Drops long silent spans using frame-energy voice activity detection.
+
+    The silence threshold follows the recording's own levels: a frame counts
+    as speech if it rises NOISE_MARGIN_DB above the noise floor (10th
+    percentile) or comes within RELATIVE_DB of the loud frames (95th
+    percentile), whichever is lower, so a phone far from the lecturer keeps
+    its quiet speech. SILENCE_FLOOR_DB only bounds the threshold from below.
+    Short pauses between words are kept; only spans longer than MIN_SILENCE_MS
+    are cut, and KEEP_SILENCE_MS of padding is left either side of speech.
+
+    Args:
+        samples: int16 mono PCM samples
+        sample_rate: Sample rate of `samples` in Hz
+
+    Returns:
+        int16 array with the long silences removed
+    """
+    frame_len = int(sample_rate * FRAME_MS / 1000)
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return samples
+
+    # Frame energy in chunks: a float copy of a whole 2-hour lecture would be ~1 GB
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+    rms = np.empty(n_frames, dtype=np.float32)
+    for start in range(0, n_frames, RMS_CHUNK_FRAMES):
+        chunk = frames[start:start + RMS_CHUNK_FRAMES].astype(np.float32)
+        rms[start:start + len(chunk)] = np.sqrt(np.mean(chunk * chunk, axis=1))
+    db = 20.0 * np.log10(np.maximum(rms / 32768.0, 1e-10))
+
+    noise_floor, loud = np.percentile(db, [10, 95])
+    threshold = max(SILENCE_FLOOR_DB, min(noise_floor + NOISE_MARGIN_DB, loud - RELATIVE_DB))
+    voiced = db > threshold
+    if not voiced.any():
+        return samples[:0]
+
+    # Grow speech regions by the padding so word onsets/tails survive
+    pad = max(1, KEEP_SILENCE_MS // FRAME_MS)
+    keep = np.convolve(voiced.astype(np.int8), np.ones(2 * pad + 1, dtype=np.int8), mode="same") > 0
+
+    # Re-admit silent runs that are too short to be worth cutting
+    min_run = max(1, MIN_SILENCE_MS // FRAME_MS)
+    edges = np.diff(np.concatenate(([1], keep.astype(np.int8), [1])))
+    starts = np.flatnonzero(edges == -1)
+    ends = np.flatnonzero(edges == 1)
+    for start, end in zip(starts, ends):
+        if end - start < min_run:
+            keep[start:end] = True
+
+    # Copy out the kept runs (plus any trailing partial frame if the last frame was kept)
+    edges = np.diff(np.concatenate(([0], keep.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1) * frame_len
+    ends = np.flatnonzero(edges == -1) * frame_len
+    if keep[-1]:
+        ends[-1] = len(samples)
+    return np.concatenate([samples[start:end] for start, end in zip(starts, ends)])
+
+
+def encode_pcm(samples: np.ndarray, sample_rate: int = TARGET_SAMPLE_RATE) -> bytes:
+    """
+    Re-encodes mono PCM samples to a compact compressed format.
+
+    Args:
+        samples: int16 mono PCM samples
+        sample_rate: Sample rate of `samples` in Hz
+
+    Returns:
+        Encoded audio file bytes (OUTPUT_FORMAT)
+    """
+    result = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "s16le", "-ac", "1", "-ar", str(sample_rate),
+            "-i", "pipe:0",
+            "-b:a", OUTPUT_BITRATE,
+            "-f", OUTPUT_FORMAT,
+            "pipe:1",
+        ],
+        input=samples.tobytes(),
+        capture_output=True,
+        check=True,
+    )
+    return result.stdout
+
+
+def preprocess_audio(audio_bytes: bytes, filename: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Prepares uploaded audio for Whisper: decode, trim silence, downsample, re-encode.
+
+    Long silences are what trigger most of Whisper's counting and "thank you
+    for watching" hallucinations, and they cost upload time for nothing.
+    If ffmpeg is missing or decoding fails, the original bytes are passed
+    through untouched so ingest still works.
+
+    Args:
+        audio_bytes: Raw uploaded audio file bytes
+        filename: Original upload filename (used for the pass-through case)
+
+    Returns:
+        Dictionary with the bytes to upload, their filename, the original and
+        processed sizes, bytes saved and durations in seconds
+    """
+    original_size = len(audio_bytes)
+    result = {
+        "audio_bytes": audio_bytes,
+        "filename": filename or "audio.m4a",
+        "original_size": original_size,
+        "processed_size": original_size,
+        "bytes_saved": 0,
+        "original_duration": None,
+        "processed_duration": None,
+        "processed": False,
+    }
+
+    if not ffmpeg_available():
+        print("ffmpeg not found, skipping audio preprocessing", flush=True)
+        return result
+
+    try:
+        samples = decode_to_pcm(audio_bytes)
+        trimmed = trim_silence(samples)
+        if len(trimmed) == 0:
+            # Nothing above the noise floor - let Whisper decide rather than upload nothing
+            trimmed = samples
+        encoded = encode_pcm(trimmed)
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+        print(f"Audio preprocessing failed, using original upload: {str(e)}", flush=True)
+        return result
+
+    # Never make things worse (e.g. an already-tiny, speech-dense upload)
+    if not encoded or len(encoded) >= original_size:
+        result["original_duration"] = len(samples) / TARGET_SAMPLE_RATE
+        result["processed_duration"] = result["original_duration"]
+        return result
+
+    stem = (filename or "audio").rsplit(".", 1)[0]
+    result.update({
+        "audio_bytes": encoded,
+        "filename": f"{stem}.{OUTPUT_FORMAT}",
+        "processed_size": len(encoded),
+        "bytes_saved": original_size - len(encoded),
+        "original_duration": len(samples) / TARGET_SAMPLE_RATE,
+        "processed_duration": len(trimmed) / TARGET_SAMPLE_RATE,
+        "processed": True,
+    })
+
+    print(
+        f"Preprocessed audio: {original_size / (1024 * 1024):.1f}MB -> {len(encoded) / (1024 * 1024):.1f}MB "
+        f"({result['bytes_saved']} bytes saved), "
+        f"{result['original_duration']:.0f}s -> {result['processed_duration']:.0f}s",
+        flush=True
+    )
+    return result
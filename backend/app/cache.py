@@ -0,0 +1,148 @@
+import os
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from app.shared import SharedStore, MappedArray
+
+
+class SemanticCache:
+    """
+    LRU answer cache keyed by query-embedding similarity, shared by all workers.
+
+    Each entry stores the normalized query embedding, the ids of the memories
+    retrieved to answer it and the answer itself. A lookup hits when a stored
+    embedding in the same namespace has cosine similarity >= `threshold` with
+    the new query.
+
+    Answers live in the shared SQLite store; the embeddings of each namespace
+    live in a memory-mapped array file that every worker maps read-only, so
+    adding workers doesn't add copies. Ingesting new memories calls
+    invalidate(), which bumps a shared generation number and makes every
+    worker ignore entries from before the bump.
+    """
+
+    GENERATION = "answer_cache:generation"
+
+    def __init__(self, store: SharedStore, directory: str, max_entries: int = 512, threshold: float = 0.92):
+        self.store = store
+        self.directory = directory
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._indexes: Dict[str, MappedArray] = {}
+
+    @property
+    def generation(self) -> int:
+        """Current shared generation; read it before retrieval and pass it to store()."""
+        return self.store.counter(self.GENERATION)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _index(self, namespace: str) -> MappedArray:
+        if namespace not in self._indexes:
+            self._indexes[namespace] = MappedArray(os.path.join(self.directory, f"answers_{namespace}.npy"))
+        return self._indexes[namespace]
+
+    def lookup(self, namespace: str, embedding) -> Optional[Dict[str, Any]]:
+        """
+        Finds the most similar cached query in a namespace.
+
+        Args:
+            namespace: Endpoint the answer belongs to (e.g. "chat", "search")
+            embedding: Query embedding
+
+        Returns:
+            Cached entry dict ({"answer", "source_ids", "extra", "similarity"}) or None
+        """
+        query = self._normalize(embedding)
+        rows = self._index(namespace).read()
+        generation = self.generation
+
+        if rows is None or len(rows) == 0 or rows["embedding"].shape[1] != len(query):
+            self.misses += 1
+            return None
+
+        similarities = rows["embedding"] @ query
+        similarities[rows["generation"] != generation] = -1.0
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        entry_id = str(int(rows["id"][best]))
+        entry = self.store.get(f"answers:{namespace}", entry_id)
+        if entry is None:
+            # Evicted by another worker since the index file was written
+            self.misses += 1
+            return None
+
+        self.store.touch(f"answers:{namespace}", entry_id)
+        self.hits += 1
+        return {
+            "answer": entry["answer"],
+            "source_ids": entry["source_ids"],
+            "extra": entry["extra"],
+            "similarity": float(similarities[best]),
+        }
+
+    def store_answer(self, namespace: str, embedding, source_ids: List[str], answer: str,
+                     generation: int, extra: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Caches an answer.
+
+        Args:
+            namespace: Endpoint the answer belongs to
+            embedding: Query embedding
+            source_ids: Ids of the memories used to produce the answer
+            answer: Generated answer text
+            generation: Value of self.generation read before retrieval; the entry
+                is discarded if memories were ingested in the meantime
+            extra: Any additional endpoint-specific payload to return on a hit
+        """
+        if generation != self.generation:
+            return
+
+        vector = self._normalize(embedding)
+        index = self._index(namespace)
+        dtype = np.dtype([("id", "<i8"), ("generation", "<i8"), ("embedding", "<f4", (len(vector),))])
+
+        with index.locked():
+            entry_id = self.store.increment("answer_cache:ids")
+            self.store.set(f"answers:{namespace}", str(entry_id), {
+                "source_ids": list(source_ids),
+                "answer": answer,
+                "extra": extra or {},
+            })
+            evicted = {int(key) for key in self.store.trim(f"answers:{namespace}", self.max_entries)}
+
+            # Rebuild the mapped index without evicted or stale rows, plus the new one
+            rows = index.read()
+            if rows is not None and rows.dtype == dtype:
+                keep = (rows["generation"] == generation) & ~np.isin(rows["id"], list(evicted))
+                rows = np.array(rows[keep])
+            else:
+                rows = np.zeros(0, dtype=dtype)
+
+            new_row = np.zeros(1, dtype=dtype)
+            new_row["id"] = entry_id
+            new_row["generation"] = generation
+            new_row["embedding"] = vector
+            index.write(np.concatenate([rows, new_row]))
+
+    def invalidate(self) -> None:
+        """Marks every cached answer stale in all workers. Call whenever memories change."""
+        self.store.increment(self.GENERATION)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns this worker's hit/miss counters and the shared generation."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "generation": self.generation,
+        }
@@ -0,0 +1,60 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+
+# Seconds spent importing/initializing each dependency, reported by /ready
+startup_profile: Dict[str, float] = {}
+
+_lock = threading.Lock()
+_async_openai_client = None
+
+
+@contextmanager
+def timed(name: str):
+    """Records how long the wrapped block takes under `name` in startup_profile."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_profile[name] = round(time.perf_counter() - start, 4)
+
+
+def get_async_openai_client():
+    """
+    Returns the shared AsyncOpenAI client, importing and constructing it on first call.
+
+    The openai package alone takes a noticeable fraction of a second to import,
+    so it is kept off the startup path.
+    """
+    global _async_openai_client
+    if _async_openai_client is None:
+        with _lock:
+            if _async_openai_client is None:
+                with timed("openai"):
+                    from openai import AsyncOpenAI
+                    _async_openai_client = AsyncOpenAI()
+    return _async_openai_client
+
+
+def warm_up(include_vector: bool = False) -> Dict[str, Any]:
+    """
+    Initializes heavy dependencies ahead of the first request.
+
+    Args:
+        include_vector: Also load Chroma and the embedding model
+
+    Returns:
+        Copy of startup_profile after warm-up
+    """
+    get_async_openai_client()
+    if include_vector:
+        from app.db import get_collection, vector_available
+        if vector_available():
+            get_collection()
+    return dict(startup_profile)
+
+
+def is_loaded() -> bool:
+    """Returns True once the OpenAI client has been created."""
+    return _async_openai_client is not None
@@ -1,22 +1,67 @@
-from chromadb import Client
-from chromadb.config import Settings
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
-
-# 1. Create persistent client (NEW API)
-client = Client(
-    Settings(
-        anonymized_telemetry=False,
-        persist_directory="chroma_data"
+import importlib.util
+import threading
+
+from app.clients import timed
+
+# Chroma and SentenceTransformer are only loaded on first use: importing them
+# and loading the model takes seconds and hundreds of MB, which slows cold starts
+_lock = threading.Lock()
+_client = None
+_embedding_fn = None
+_collection = None
+
+
+def vector_available() -> bool:
+    """Returns True if chromadb and sentence-transformers are installed."""
+    return (
+        importlib.util.find_spec("chromadb") is not None
+        and importlib.util.find_spec("sentence_transformers") is not None
     )
-)
-
-# 2. Embedding model
-embedding_fn = SentenceTransformerEmbeddingFunction(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
-)
-
-# 3. Create or load collection
-collection = client.get_or_create_collection(
-    name="notes",
-    embedding_function=embedding_fn
-)
+
+
+def get_embedding_fn():
+    """Returns the SentenceTransformer embedding function, loading the model on first call."""
+    global _embedding_fn
+    if _embedding_fn is None:
+        with _lock:
+            if _embedding_fn is None:
+                with timed("embedding_model"):
+                    from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+
+                    # Embedding model
+                    _embedding_fn = SentenceTransformerEmbeddingFunction(
+                        model_name="sentence-transformers/all-MiniLM-L6-v2"
+                    )
+    return _embedding_fn
+
+
+def get_collection():
+    """Returns the notes collection, creating the Chroma client on first call."""
+    global _client, _collection
+    embedding_fn = get_embedding_fn()
+    if _collection is None:
+        with _lock:
+            if _collection is None:
+                with timed("chroma"):
+                    from chromadb import Client
+                    from chromadb.config import Settings
+
+                    # 1. Create persistent client (NEW API)
+                    _client = Client(
+                        Settings(
+                            anonymized_telemetry=False,
+                            persist_directory="chroma_data"
+                        )
+                    )
+
+                    # 2. Create or load collection
+                    _collection = _client.get_or_create_collection(
+                        name="notes",
+                        embedding_function=embedding_fn
+                    )
+    return _collection
+
+
+def is_loaded() -> bool:
+    """Returns True once the collection has been initialized."""
+    return _collection is not None
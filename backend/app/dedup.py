@@ -0,0 +1,297 @@
+import json
+import re
+import zlib
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.shared import SharedStore
+
+
+# MinHash settings: NUM_PERM = BANDS * ROWS. With 32 bands of 4 rows, pairs above
+# ~0.5 Jaccard similarity almost always share a bucket; exact similarity is then
+# estimated from the full signature.
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+
+# Texts with fewer shingles than this aren't indexed or looked up: every empty or
+# near-empty text gets the same signature, so they would all "match" each other
+MIN_TRANSCRIPT_SHINGLES = 20
+MIN_FLASHCARD_SHINGLES = 8
+
+# Mersenne prime for the universal hash family (a * x + b) mod p
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_BAND_MIX = (_rng.randint(1, 1 << 31, size=ROWS).astype(np.uint64) << np.uint64(32)) | np.uint64(1)
+
+
+def word_shingles(text: str, k: int = 5) -> Set[str]:
+    """
+    Splits text into overlapping k-word shingles (for transcripts).
+
+    Args:
+        text: Text to shingle
+        k: Words per shingle
+
+    Returns:
+        Set of shingle strings
+    """
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    if len(words) <= k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def char_shingles(text: str, k: int = 4) -> Set[str]:
+    """
+    Splits text into overlapping k-character shingles (for short texts like flashcards).
+
+    Args:
+        text: Text to shingle
+        k: Characters per shingle
+
+    Returns:
+        Set of shingle strings
+    """
+    normalized = " ".join(re.findall(r"[a-z0-9']+", text.lower()))
+    if len(normalized) <= k:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + k] for i in range(len(normalized) - k + 1)}
+
+
+def band_keys(signature: np.ndarray) -> np.ndarray:
+    """
+    Hashes each band of a signature to a single positive integer bucket key.
+
+    Args:
+        signature: MinHash signature from minhash()
+
+    Returns:
+        int64 array of BANDS positive keys
+    """
+    # Hash values fit in 32 bits; mix each band's rows into one 63-bit key (wraps mod 2**64)
+    rows = signature.astype(np.uint64).reshape(BANDS, ROWS)
+    with np.errstate(over="ignore"):
+        mixed = (rows * _BAND_MIX).sum(axis=1, dtype=np.uint64)
+    return ((mixed >> np.uint64(1)) | np.uint64(1)).astype(np.int64)
+
+
+def minhash(shingles: Set[str]) -> np.ndarray:
+    """
+    Computes a MinHash signature for a set of shingles.
+
+    Args:
+        shingles: Shingle set
+
+    Returns:
+        uint64 array of NUM_PERM minimum hash values
+    """
+    if not shingles:
+        return np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    # (n_perm, batch) -> min over shingles, batched to bound memory on long transcripts
+    signature = np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    for start in range(0, len(hashes), 4096):
+        batch = hashes[start:start + 4096]
+        permuted = (np.outer(_A, batch) + _B[:, None]) % _PRIME & _MAX_HASH
+        signature = np.minimum(signature, permuted.min(axis=1))
+    return signature
+
+
+class LSHIndex:
+    """
+    Banded MinHash LSH index with an attached payload per item.
+
+    Each band of a signature is hashed to one integer bucket key; lookups
+    estimate similarity only for items sharing a bucket, and the oldest items
+    are dropped once `max_items` is exceeded.
+
+    Items and bucket keys live in SQLite tables on the shared database
+    (looked up through an index), so workers hold nothing locally and see
+    each other's items immediately.
+    """
+
+    def __init__(self, store: SharedStore, namespace: str, threshold: float, max_items: int = 5000):
+        self.store = store
+        self.namespace = namespace
+        self.threshold = threshold
+        self.max_items = max_items
+
+        with store.transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS lsh_items ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " namespace TEXT NOT NULL, item_id TEXT NOT NULL,"
+                " signature BLOB NOT NULL, payload TEXT,"
+                " UNIQUE (namespace, item_id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS lsh_items_age ON lsh_items (namespace, id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS lsh_bands ("
+                " namespace TEXT NOT NULL, band INTEGER NOT NULL, key INTEGER NOT NULL,"
+                " item INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS lsh_bands_lookup ON lsh_bands (namespace, band, key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS lsh_bands_item ON lsh_bands (item)")
+
+    def add(self, item_id: str, signature: np.ndarray, payload: Any = None) -> None:
+        """
+        Inserts an item.
+
+        Args:
+            item_id: Unique id (e.g. memory id)
+            signature: MinHash signature from minhash()
+            payload: Data to hand back when this item is matched
+        """
+        self.add_many([(item_id, signature, payload)])
+
+    def add_many(self, items: List[Tuple[str, np.ndarray, Any]]) -> None:
+        """
+        Inserts several items in one transaction, trimming the index to `max_items` once at the end.
+
+        Args:
+            items: (item_id, signature, payload) tuples
+        """
+        if not items:
+            return
+
+        with self.store.transaction() as conn:
+            for item_id, signature, payload in items:
+                self._delete(conn, item_id)
+                cursor = conn.execute(
+                    "INSERT INTO lsh_items (namespace, item_id, signature, payload) VALUES (?, ?, ?, ?)",
+                    (self.namespace, item_id, signature.astype(np.uint32).tobytes(), json.dumps(payload))
+                )
+                conn.executemany(
+                    "INSERT INTO lsh_bands (namespace, band, key, item) VALUES (?, ?, ?, ?)",
+                    [(self.namespace, band, int(key), cursor.lastrowid)
+                     for band, key in enumerate(band_keys(signature))]
+                )
+            self._trim(conn)
+
+    def _delete(self, conn, item_id: str) -> None:
+        row = conn.execute(
+            "SELECT id FROM lsh_items WHERE namespace = ? AND item_id = ?",
+            (self.namespace, item_id)
+        ).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM lsh_bands WHERE item = ?", (row[0],))
+            conn.execute("DELETE FROM lsh_items WHERE id = ?", (row[0],))
+
+    def _trim(self, conn) -> None:
+        row = conn.execute(
+            "SELECT id FROM lsh_items WHERE namespace = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+            (self.namespace, self.max_items)
+        ).fetchone()
+        if row is None:
+            return
+        conn.execute(
+            "DELETE FROM lsh_bands WHERE item IN"
+            " (SELECT id FROM lsh_items WHERE namespace = ? AND id <= ?)",
+            (self.namespace, row[0])
+        )
+        conn.execute("DELETE FROM lsh_items WHERE namespace = ? AND id <= ?", (self.namespace, row[0]))
+
+    def query(self, signature: np.ndarray) -> List[Tuple[str, float, Any]]:
+        """
+        Finds indexed items whose estimated Jaccard similarity meets the threshold.
+
+        Args:
+            signature: MinHash signature to look up
+
+        Returns:
+            List of (item_id, similarity, payload) tuples, most similar first
+        """
+        keys = band_keys(signature)
+        signature = signature.astype(np.uint32)
+        conn = self.store.connection()
+
+        # One indexed probe per band bucket
+        candidates = conn.execute(
+            "WITH probe (band, key) AS (VALUES " + ", ".join(["(?, ?)"] * BANDS) + ")"
+            " SELECT DISTINCT i.id, i.item_id, i.signature FROM probe"
+            " JOIN lsh_bands b ON b.namespace = ? AND b.band = probe.band AND b.key = probe.key"
+            " JOIN lsh_items i ON i.id = b.item",
+            [value for band, key in enumerate(keys) for value in (band, int(key))] + [self.namespace]
+        ).fetchall()
+
+        matches = []
+        for row_id, item_id, blob in candidates:
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint32) == signature))
+            if similarity >= self.threshold:
+                payload = conn.execute("SELECT payload FROM lsh_items WHERE id = ?", (row_id,)).fetchone()
+                if payload is not None:
+                    matches.append((item_id, similarity, json.loads(payload[0])))
+        return sorted(matches, key=lambda m: -m[1])
+
+    def best_match(self, signature: np.ndarray) -> Optional[Tuple[str, float, Any]]:
+        """Returns the most similar item above the threshold, or None."""
+        matches = self.query(signature)
+        return matches[0] if matches else None
+
+    def __len__(self) -> int:
+        return self.store.connection().execute(
+            "SELECT COUNT(*) FROM lsh_items WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+
+
+def flashcard_signature(card: Dict[str, str]) -> Optional[np.ndarray]:
+    """Computes the MinHash signature of a flashcard's front and back text (None if too short to compare)."""
+    shingles = char_shingles(f"{card['front']} {card['back']}")
+    return minhash(shingles) if len(shingles) >= MIN_FLASHCARD_SHINGLES else None
+
+
+def transcript_signature(text: str) -> Optional[np.ndarray]:
+    """Computes the MinHash signature of a transcript (None if too short to compare, e.g. silence)."""
+    shingles = word_shingles(text)
+    return minhash(shingles) if len(shingles) >= MIN_TRANSCRIPT_SHINGLES else None
+
+
+def drop_duplicate_flashcards(cards: List[Dict[str, str]], index: LSHIndex, memory_id: str) -> List[Dict[str, str]]:
+    """
+    Filters out flashcards that near-duplicate already-indexed cards, then indexes the rest.
+
+    Cards within the same batch are also checked against each other. The kept
+    cards are indexed together in one write.
+
+    Args:
+        cards: Flashcard dicts with "front" and "back"
+        index: Flashcard LSH index
+        memory_id: Memory the cards belong to (used to build card ids)
+
+    Returns:
+        The flashcards that were kept
+    """
+    kept = []
+    kept_signatures = []
+    for card in cards:
+        signature = flashcard_signature(card)
+        if signature is None:
+            # Too short to compare meaningfully; keep it but don't index it
+            kept.append(card)
+            continue
+        if any(np.mean(other == signature) >= index.threshold for other in kept_signatures):
+            continue
+        if index.best_match(signature) is not None:
+            continue
+        kept.append(card)
+        kept_signatures.append(signature)
+
+    index.add_many([
+        (f"{memory_id}:{i}", signature, memory_id)
+        for i, signature in enumerate(kept_signatures)
+    ])
+
+    if len(kept) < len(cards):
+        print(f"Dropped {len(cards) - len(kept)} duplicate flashcards", flush=True)
+    return kept
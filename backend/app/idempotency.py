@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from app.shared import SharedStore
+
+
+NAMESPACE = "idempotency"
+
+
+def fingerprint(body: Any) -> str:
+    """
+    Hashes a request body so a reused Idempotency-Key with a different request can be rejected.
+
+    Args:
+        body: Raw bytes, or any JSON-serializable value
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    if not isinstance(body, (bytes, bytearray)):
+        body = json.dumps(jsonable_encoder(body), sort_keys=True).encode("utf-8")
+    return hashlib.sha256(body).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Deduplicates retried requests that carry the same Idempotency-Key header.
+
+    The first request with a key claims it in the shared store and runs; a
+    retry that arrives while it is still running waits for it (in-process via
+    a future, across workers by polling the store) and gets the same
+    response. Completed responses are kept for `ttl` seconds, bounded to
+    `max_records`. Failures are not recorded, so a retry after an error runs
+    again. If the worker running a request dies, its claim lapses after
+    `lease` seconds and the next retry takes over.
+    """
+
+    def __init__(self, store: SharedStore, ttl: float = 86400, lease: float = 1800,
+                 max_records: int = 10000, poll_interval: float = 1.0):
+        self.store = store
+        self.ttl = ttl
+        self.lease = lease
+        self.max_records = max_records
+        self.poll_interval = poll_interval
+        self.replayed = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def run(self, scope: str, key: Optional[str], request_fingerprint: str,
+                  func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs `func` at most once per (scope, key) while the record lives.
+
+        Args:
+            scope: Endpoint name, so the same key on different endpoints doesn't collide
+            key: Idempotency-Key header value; None runs func unconditionally
+            request_fingerprint: fingerprint() of the request body
+            func: Coroutine function producing the response
+
+        Returns:
+            The response from this execution, or the JSON-encoded stored
+            response of the original one
+
+        Raises:
+            HTTPException: 422 if the key was used with a different request
+        """
+        if not key:
+            return await func()
+
+        record_key = f"{scope}:{key}"
+        while True:
+            record = self.store.get(NAMESPACE, record_key)
+            if record is not None:
+                if record["fingerprint"] != request_fingerprint:
+                    raise HTTPException(
+                        status_code=422,
+                        detail="Idempotency-Key was already used with a different request"
+                    )
+                # Same worker: attach to the running execution directly
+                future = self._in_flight.get(record_key)
+                if future is not None:
+                    self.replayed += 1
+                    return await asyncio.shield(future)
+                if record["status"] == "completed":
+                    self.replayed += 1
+                    return record["response"]
+                # Running on another worker: wait for it to finish or its lease to lapse
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            claim = {"status": "pending", "fingerprint": request_fingerprint, "claimed_at": time.time()}
+            if self.store.add(NAMESPACE, record_key, claim, ttl=self.lease):
+                return await self._execute(record_key, request_fingerprint, func)
+
+    async def _execute(self, record_key: str, request_fingerprint: str,
+                       func: Callable[[], Awaitable[Any]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[record_key] = future
+        try:
+            result = await func()
+        except BaseException as e:
+            self._in_flight.pop(record_key, None)
+            self.store.delete(NAMESPACE, record_key)
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Mark retrieved so an error nobody waited for isn't logged as unhandled
+                future.exception()
+            else:
+                future.cancel()
+            raise
+
+        self.store.set(NAMESPACE, record_key, {
+            "status": "completed",
+            "fingerprint": request_fingerprint,
+            "response": jsonable_encoder(result)
+        }, ttl=self.ttl)
+        self.store.trim(NAMESPACE, self.max_records)
+        future.set_result(result)
+        self._in_flight.pop(record_key, None)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns this worker's in-flight and replay counts."""
+        return {"in_flight": len(self._in_flight), "replayed": self.replayed}
@@ -1,7 +1,16 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import time
+_import_start = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from openai import OpenAI
+from typing import Optional, Callable, Any, Literal
+from contextlib import asynccontextmanager
+import asyncio
+import threading
+import json
 import uuid
 from datetime import datetime
 from dotenv import load_dotenv
@@ -10,21 +19,88 @@ import os
 # Load environment variables from .env file
 load_dotenv()
 
-# ChromaDB disabled for deployment (too memory-heavy for free tier)
-# from app.db import collection, embedding_fn
-from app.utils import parse_gpt_json, extract_structured_digest, extract_smartnotes, extract_flashcards, remove_repetitive_endings, remove_hallucinations
+# Heavy clients (OpenAI, Chroma, SentenceTransformer) are created lazily on first use
+from app.clients import startup_profile, warm_up
+from app.resilience import chat_completion
+from app.summarize import extractive_digest
+from app import clients, db, workers, resilience
+from app.workers import run_text_task
+from app.utils import parse_gpt_json, extract_structured_digest, extract_smartnotes, extract_flashcards, clean_transcript
+from app.audio import preprocess_audio
+from app.sessions import DocumentStore
+from app.cache import SemanticCache
+from app.shared import SharedStore, SHARED_DIR
+from app.idempotency import IdempotencyStore, fingerprint
+from app.dedup import LSHIndex, transcript_signature, drop_duplicate_flashcards
 from app.models import (
     IngestResponse, IngestResponseData, TranscriptData, DigestData, MemoryMetadata,
+    AudioProcessingData,
     Flashcard, FlashcardsData,
     SearchResponse, SearchResponseData, SearchSource,
     ChatResponse, ChatResponseData,
     SmartNotesResponse, SmartNotesData,
     TranscribeResponse, TranscribeResponseData,
+    DocumentResponse, DocumentResponseData,
     ErrorResponse
 )
 
-client = OpenAI()
-app = FastAPI(title="Rizq Memory Engine API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Optional: load heavy clients in the background so /ready flips once they're hot
+    if os.getenv("RIZQ_WARMUP", "0") == "1":
+        threading.Thread(target=_warm_up, name="rizq-warmup", daemon=True).start()
+    else:
+        _warmup_done.set()
+    yield
+    workers.shutdown()
+
+app = FastAPI(title="Rizq Memory Engine API", lifespan=lifespan)
+
+# State shared by all workers on this host (SQLite WAL + memory-mapped index files)
+shared = SharedStore(os.path.join(SHARED_DIR, "state.sqlite3"))
+
+# Uploaded documents for /ask sessions (evicted when idle or over the memory budget).
+# Each worker keeps its own indexes, so the host-wide budget is split between workers
+_worker_count = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+documents = DocumentStore(
+    max_bytes=int(os.getenv("RIZQ_SESSION_MEMORY_MB", "64")) * 1024 * 1024 // _worker_count,
+    idle_ttl=float(os.getenv("RIZQ_SESSION_IDLE_SECONDS", "1800")),
+    store=shared,
+    max_documents=int(os.getenv("RIZQ_SESSION_MAX_DOCUMENTS", "1000"))
+)
+
+# Idempotency-Key records so client retries reuse the original execution
+idempotency = IdempotencyStore(
+    shared,
+    ttl=float(os.getenv("RIZQ_IDEMPOTENCY_TTL_SECONDS", "86400")),
+    lease=float(os.getenv("RIZQ_IDEMPOTENCY_LEASE_SECONDS", "1800")),
+    max_records=int(os.getenv("RIZQ_IDEMPOTENCY_MAX_RECORDS", "10000"))
+)
+
+# Answers for /chat and /search, reused for similar phrasings until new memories arrive
+answer_cache = SemanticCache(
+    shared,
+    SHARED_DIR,
+    max_entries=int(os.getenv("RIZQ_ANSWER_CACHE_SIZE", "512")),
+    threshold=float(os.getenv("RIZQ_ANSWER_CACHE_THRESHOLD", "0.92"))
+)
+
+# Near-duplicate detection for re-uploaded lectures and repeated flashcards
+transcript_index = LSHIndex(
+    shared,
+    "lsh:transcripts",
+    threshold=float(os.getenv("RIZQ_DUPLICATE_THRESHOLD", "0.85"))
+)
+flashcard_index = LSHIndex(
+    shared,
+    "lsh:flashcards",
+    threshold=float(os.getenv("RIZQ_FLASHCARD_DUPLICATE_THRESHOLD", "0.8")),
+    max_items=50000
+)
+
+startup_profile["imports"] = round(time.perf_counter() - _import_start, 4)
+_warmup_done = threading.Event()
+_warmup_error: Optional[str] = None
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,138 +111,283 @@ app.add_middleware(
 )
 
 
+def _warm_up():
+    global _warmup_error
+    try:
+        warm_up(include_vector=os.getenv("RIZQ_WARMUP_VECTOR", "0") == "1")
+        print(f"Warm-up finished: {startup_profile}", flush=True)
+    except Exception as e:
+        # /ready keeps failing so the probe doesn't route traffic to a broken worker
+        _warmup_error = str(e)
+        print(f"Warm-up failed: {str(e)}", flush=True)
+    finally:
+        _warmup_done.set()
+
+
+# "auto": LLM digest unless shedding load or the upstream fails; "llm": never degrade; "local": extractive only
+DigestMode = Literal["auto", "llm", "local"]
+
+
+def use_local_digest(digest_mode: str) -> bool:
+    """Returns True if the digest should be built locally without calling the LLM."""
+    return digest_mode == "local" or (digest_mode == "auto" and resilience.overloaded())
+
+
 @app.get("/")
 def root():
     return {"status": "ok", "message": "Rizq backend running"}
 
+@app.get("/ready")
+def ready():
+    if not _warmup_done.is_set():
+        raise HTTPException(status_code=503, detail="Warming up")
+    if _warmup_error is not None:
+        raise HTTPException(status_code=503, detail=f"Warm-up failed: {_warmup_error}")
+    return {
+        "status": "ready",
+        "loaded": {
+            "openai": clients.is_loaded(),
+            "vector": db.is_loaded()
+        },
+        "startup_profile": startup_profile,
+        "answer_cache": answer_cache.stats(),
+        "cpu_workers": workers.stats(),
+        "idempotency": idempotency.stats(),
+        "upstream": resilience.stats()
+    }
+
 class SmartNotesRequest(BaseModel):
     text: str
 
 @app.post("/smartnotes")
-async def smartnotes(req: SmartNotesRequest):
-    import os
+async def smartnotes(req: SmartNotesRequest, idempotency_key: Optional[str] = Header(None)):
+    async def generate():
+        import os
 
-    prompt = f"""
-    Create Smart Notes for the following text:
+        prompt = f"""
+        Create Smart Notes for the following text:
 
-    TEXT:
-    {req.text}
+        TEXT:
+        {req.text}
+
+        OUTPUT IN JSON:
+        - summary
+        - structured_notes (3-5 bullets)
+        - flashcards (list of {{"front": "...", "back": "..."}})
+        - quizzes (list of questions)
+        - eli12 (explain like I'm 12)
+        """
 
-    OUTPUT IN JSON:
-    - summary
-    - structured_notes (3-5 bullets)
-    - flashcards (list of {{"front": "...", "back": "..."}})
-    - quizzes (list of questions)
-    - eli12 (explain like I'm 12)
-    """
+        smartnotes_text = await chat_completion(prompt, operation="smartnotes")
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "user", "content": prompt}
-        ]
-    )
+        return {"smartnotes": smartnotes_text}
 
-    return {"smartnotes": response.choices[0].message.content}
+    return await idempotency.run("smartnotes", idempotency_key, fingerprint(req.model_dump()), generate)
 
 @app.post("/digest")
-async def digest(file: UploadFile = File(...)):
-    content = (await file.read()).decode("utf-8", errors="ignore")
+async def digest(file: UploadFile = File(...), digest_mode: DigestMode = "auto",
+                 idempotency_key: Optional[str] = Header(None)):
+    raw_bytes = await file.read()
+    content = raw_bytes.decode("utf-8", errors="ignore")
 
-    prompt = f"""
-    Digest the following document and produce tightly-structured JSON.
+    async def generate():
+        if use_local_digest(digest_mode):
+            local_digest = await run_text_task(extractive_digest, content)
+            return {"digest": json.dumps(local_digest), "degraded": True}
 
-    TEXT:
-    {content}
+        prompt = f"""
+        Digest the following document and produce tightly-structured JSON.
 
-    OUTPUT JSON FIELDS:
-    - summary (3–5 sentences)
-    - highlights (5 bullets)
-    - action_items (3–7 bullets)
-    - insights (3 bullets)
-    - questions (3–5 questions)
+        TEXT:
+        {content}
 
-    Return ONLY valid JSON.
-    """
+        OUTPUT JSON FIELDS:
+        - summary (3–5 sentences)
+        - highlights (5 bullets)
+        - action_items (3–7 bullets)
+        - insights (3 bullets)
+        - questions (3–5 questions)
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
-    )
+        Return ONLY valid JSON.
+        """
+
+        try:
+            digest_text = await chat_completion(prompt, operation="digest")
+        except Exception as e:
+            # Upstream throttled or down: fall back to a fast local digest instead of a 500
+            if digest_mode != "auto" or not resilience.is_upstream_failure(e):
+                raise
+            print(f"Digest falling back to local summarizer: {str(e)}", flush=True)
+            local_digest = await run_text_task(extractive_digest, content)
+            return {"digest": json.dumps(local_digest), "degraded": True}
+
+        return {"digest": digest_text, "degraded": False}
+
+    request_fingerprint = fingerprint([fingerprint(raw_bytes), digest_mode])
+    return await idempotency.run("digest", idempotency_key, request_fingerprint, generate)
 
-    return {"digest": response.choices[0].message.content}
 class AskRequest(BaseModel):
     question: str
-    content: str
+    content: Optional[str] = None
+    document_id: Optional[str] = None
+
+@app.post("/documents", response_model=DocumentResponse)
+async def upload_document(file: UploadFile = File(...)):
+    content = (await file.read()).decode("utf-8", errors="ignore")
+
+    if not content.strip():
+        raise HTTPException(status_code=400, detail="Document is empty")
+
+    document_id = documents.add(content, file.filename)
+    index = documents.get(document_id)
+
+    return DocumentResponse(
+        success=True,
+        data=DocumentResponseData(
+            document_id=document_id,
+            filename=file.filename,
+            chunk_count=len(index.chunks),
+            word_count=len(content.split())
+        ),
+        message="Document indexed. Send document_id with /ask questions."
+    )
+
+@app.delete("/documents/{document_id}")
+async def delete_document(document_id: str):
+    if not documents.remove(document_id):
+        raise HTTPException(status_code=404, detail="Document not found or expired")
+    return {"success": True}
 
 @app.post("/ask")
-async def ask(req: AskRequest):
-    safe_question = req.question.replace("“", "\"").replace("”", "\"").replace("’", "'")
-    safe_content = req.content.replace("“", "\"").replace("”", "\"").replace("’", "'")
+async def ask(req: AskRequest, idempotency_key: Optional[str] = Header(None)):
+    async def generate():
+        if req.document_id:
+            # Session mode: answer from the top-ranked chunks only
+            index = documents.get(req.document_id)
+            if index is None:
+                raise HTTPException(status_code=404, detail="Document not found or expired. Upload it again via /documents.")
+            excerpts = index.search(req.question, top_k=int(os.getenv("RIZQ_ASK_TOP_K", "4")))
+            content = "\n\n---\n\n".join(excerpt["text"] for excerpt in excerpts)
+        elif req.content:
+            content = req.content
+        else:
+            raise HTTPException(status_code=400, detail="Provide either content or document_id")
 
-    prompt = f"""
-    Use ONLY the document below to answer the question.
+        prompt = f"""
+        Use ONLY the document below to answer the question.
 
-    DOCUMENT:
-    {req.content}
+        DOCUMENT:
+        {content}
 
-    QUESTION:
-    {req.question}
+        QUESTION:
+        {req.question}
 
-    Answer concisely and accurately.
-    """
+        Answer concisely and accurately.
+        """
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
-    )
+        answer = await chat_completion(prompt, operation="ask")
+
+        return {"answer": answer}
 
-    return {"answer": response.choices[0].message.content}
+    return await idempotency.run("ask", idempotency_key, fingerprint(req.model_dump()), generate)
 
 @app.post("/transcribe")
 async def transcribe(file: UploadFile = File(...)):
     audio_bytes = await file.read()
 
-    transcription = client.audio.transcriptions.create(
-        model="whisper-1",
-        file=("audio.m4a", audio_bytes)
-    )
+    text = await resilience.transcribe(("audio.m4a", audio_bytes))
 
-    return {"text": transcription.text}
+    return {"text": text}
 
-@app.post("/ingest", response_model=IngestResponse)
-async def ingest(file: UploadFile = File(...)):
-    try:
-        audio_bytes = await file.read()
-
-        # Check file size (Whisper has 25MB limit)
-        MAX_SIZE = 24 * 1024 * 1024  # 24MB to be safe
-        filename = file.filename or "audio.m4a"
-
-        if len(audio_bytes) > MAX_SIZE:
-            # Compression disabled due to Python 3.13 compatibility issues with pydub
-            # For validation phase, just reject large files
-            size_mb = len(audio_bytes) / (1024 * 1024)
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large ({size_mb:.1f}MB). Please upload files under 25MB (about 20-30 minutes of audio)."
-            )
+def ingest_message(duplicate_of: Optional[str], degraded: bool, flashcards_skipped: bool) -> str:
+    """Builds the IngestResponse message describing how the result was produced."""
+    if duplicate_of:
+        return f"Audio processed; near-duplicate of memory {duplicate_of}, digest reused"
+    if degraded and flashcards_skipped:
+        return "Audio processed in degraded mode: digest generated locally, flashcards skipped"
+    if degraded:
+        return "Audio processed; digest generated locally"
+    if flashcards_skipped:
+        return "Audio processed; flashcards unavailable (AI service busy), please retry later"
+    return "Audio processed and stored successfully"
+
+async def run_ingest(raw_bytes: bytes, upload_filename: Optional[str], digest_mode: str = "auto"):
+    """
+    Runs the ingest pipeline, yielding (event, payload) as each stage finishes.
+
+    Events, in order: "transcript", "digest", "flashcards", then "result" with
+    the full IngestResponse. Used by both /ingest and /ingest/stream.
+    """
+    # Bound what gets decoded: the whole recording is held as 16kHz PCM while trimming
+    MAX_UPLOAD_SIZE = int(os.getenv("RIZQ_MAX_UPLOAD_MB", "100")) * 1024 * 1024
+
+    if len(raw_bytes) > MAX_UPLOAD_SIZE:
+        size_mb = len(raw_bytes) / (1024 * 1024)
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large ({size_mb:.1f}MB). Maximum upload is {MAX_UPLOAD_SIZE // (1024 * 1024)}MB."
+        )
 
-        # 1. Transcribe (force English to handle accented speakers)
-        # Use prompt to suppress common hallucinations
-        transcription = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=(filename, audio_bytes),
-            language="en",  # Force English transcription
-            prompt="This is a university lecture recording. Transcribe only the actual spoken lecture content."
+    # Trim silence and downsample to 16kHz mono before upload (NumPy VAD, no audioop).
+    # ffmpeg and the VAD take seconds on long lectures, so keep them off the event loop
+    audio = await asyncio.to_thread(preprocess_audio, raw_bytes, upload_filename)
+    audio_bytes = audio["audio_bytes"]
+    filename = audio["filename"]
+
+    # Check file size (Whisper has 25MB limit)
+    MAX_SIZE = 24 * 1024 * 1024  # 24MB to be safe
+
+    if len(audio_bytes) > MAX_SIZE:
+        size_mb = len(audio_bytes) / (1024 * 1024)
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large ({size_mb:.1f}MB after compression). Please upload a shorter recording."
         )
-        text = transcription.text
 
-        # Clean up hallucinations and repetitions
-        text = remove_hallucinations(text)
-        text = remove_repetitive_endings(text)
+    # 1. Transcribe (force English to handle accented speakers)
+    # Use prompt to suppress common hallucinations
+    text = await resilience.transcribe(
+        (filename, audio_bytes),
+        language="en",  # Force English transcription
+        prompt="This is a university lecture recording. Transcribe only the actual spoken lecture content."
+    )
+
+    # Clean up hallucinations and repetitions (in the process pool for long transcripts)
+    text = await run_text_task(clean_transcript, text)
 
-        # 2. Digest - improved prompt for clean JSON
+    # Generate unique ID for this memory
+    memory_id = str(uuid.uuid4())
+
+    transcript = TranscriptData(
+        text=text,
+        word_count=len(text.split()),
+        duration=audio["original_duration"]
+    )
+    metadata = MemoryMetadata(
+        created_at=datetime.now().isoformat(),
+        filename=upload_filename,
+        type="audio_ingest"
+    )
+    yield "transcript", {"memory_id": memory_id, "transcript": transcript, "metadata": metadata}
+
+    # Re-recorded/re-uploaded lectures: reuse the near-duplicate memory's digest and flashcards
+    # Empty or very short transcripts (silence) have no signature and are never matched
+    signature = transcript_signature(text)
+    duplicate = transcript_index.best_match(signature) if signature is not None else None
+    duplicate_of = None
+    degraded = False
+    flashcards_skipped = False
+
+    if duplicate is not None:
+        duplicate_of, similarity, previous = duplicate
+        print(f"Transcript is a near-duplicate of {duplicate_of} ({similarity:.2f}), reusing digest", flush=True)
+        metadata.duplicate_of = duplicate_of
+        parsed_digest = previous["digest"]
+        yield "digest", DigestData(**parsed_digest)
+        flashcard_list = previous["flashcards"]
+    else:
+        # 2. Digest - improved prompt for clean JSON (or local extractive digest when shedding load)
+        degraded = use_local_digest(digest_mode)
         prompt = f"""
         Create a structured digest of this text. Return ONLY a valid JSON object with no markdown formatting.
 
@@ -183,15 +404,21 @@ async def ingest(file: UploadFile = File(...)):
         }}
         """
 
-        digest = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}]
-        )
+        if not degraded:
+            try:
+                digest_text = await chat_completion(prompt, operation="ingest_digest")
 
-        digest_text = digest.choices[0].message.content
+                # Parse the digest JSON
+                parsed_digest = await run_text_task(extract_structured_digest, digest_text)
+            except Exception as e:
+                if digest_mode != "auto" or not resilience.is_upstream_failure(e):
+                    raise
+                print(f"Ingest digest falling back to local summarizer: {str(e)}", flush=True)
+                degraded = True
 
-        # Parse the digest JSON
-        parsed_digest = extract_structured_digest(digest_text)
+        if degraded:
+            parsed_digest = await run_text_task(extractive_digest, text)
+        yield "digest", DigestData(**parsed_digest, degraded=degraded)
 
         # 3. Generate flashcards
         flashcard_prompt = f"""
@@ -213,172 +440,316 @@ async def ingest(file: UploadFile = File(...)):
         }}
         """
 
-        flashcard_response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": flashcard_prompt}]
+        # Skip the flashcard completion when the upstream is overloaded or just failed the digest,
+        # but not merely because the client asked for a local digest
+        flashcard_list = []
+        flashcards_skipped = digest_mode != "llm" and (
+            (digest_mode == "auto" and degraded) or resilience.overloaded()
         )
+        if not flashcards_skipped:
+            try:
+                flashcard_text = await chat_completion(flashcard_prompt, operation="ingest_flashcards")
+                flashcard_list = await run_text_task(extract_flashcards, flashcard_text)
+            except Exception as e:
+                if digest_mode == "llm" or not resilience.is_upstream_failure(e):
+                    raise
+                print(f"Skipping flashcards, upstream unavailable: {str(e)}", flush=True)
+                flashcards_skipped = True
+
+        # Drop cards that repeat ones from earlier memories
+        flashcard_list = drop_duplicate_flashcards(flashcard_list, flashcard_index, memory_id)
+
+        # Only full-quality results are worth reusing for future duplicates
+        if not degraded and not flashcards_skipped and signature is not None:
+            transcript_index.add(memory_id, signature, {
+                "digest": parsed_digest,
+                "flashcards": flashcard_list
+            })
+
+    flashcards = FlashcardsData(
+        flashcards=[Flashcard(**card) for card in flashcard_list],
+        count=len(flashcard_list)
+    )
+    yield "flashcards", flashcards
+
+    # 4. Store in Chroma with metadata
+    # DISABLED FOR DEPLOYMENT: ChromaDB uses too much memory for free tier
+    # embeddings = embedding_fn([text])
+    # collection.add(
+    #     ids=[memory_id],
+    #     documents=[text + "\n\n" + digest_text],
+    #     embeddings=embeddings,
+    #     metadatas=[{
+    #         "timestamp": datetime.now().isoformat(),
+    #         "filename": file.filename,
+    #         "type": "audio_ingest",
+    #         "word_count": len(text.split())
+    #     }]
+    # )
+
+    # New memory may change answers to earlier questions
+    answer_cache.invalidate()
+
+    # 5. Return structured response
+    yield "result", IngestResponse(
+        success=True,
+        data=IngestResponseData(
+            memory_id=memory_id,
+            transcript=transcript,
+            digest=DigestData(**parsed_digest, degraded=degraded),
+            flashcards=flashcards,
+            metadata=metadata,
+            audio=AudioProcessingData(
+                processed=audio["processed"],
+                original_size=audio["original_size"],
+                processed_size=audio["processed_size"],
+                bytes_saved=audio["bytes_saved"],
+                original_duration=audio["original_duration"],
+                processed_duration=audio["processed_duration"]
+            )
+        ),
+        message=ingest_message(duplicate_of, degraded, flashcards_skipped)
+    )
 
-        flashcard_text = flashcard_response.choices[0].message.content
-        flashcard_list = extract_flashcards(flashcard_text)
-
-        # Generate unique ID for this memory
-        memory_id = str(uuid.uuid4())
-
-        # 4. Store in Chroma with metadata
-        # DISABLED FOR DEPLOYMENT: ChromaDB uses too much memory for free tier
-        # embeddings = embedding_fn([text])
-        # collection.add(
-        #     ids=[memory_id],
-        #     documents=[text + "\n\n" + digest_text],
-        #     embeddings=embeddings,
-        #     metadatas=[{
-        #         "timestamp": datetime.now().isoformat(),
-        #         "filename": file.filename,
-        #         "type": "audio_ingest",
-        #         "word_count": len(text.split())
-        #     }]
-        # )
-
-        # 5. Return structured response
-        return IngestResponse(
-            success=True,
-            data=IngestResponseData(
-                memory_id=memory_id,
-                transcript=TranscriptData(
-                    text=text,
-                    word_count=len(text.split()),
-                    duration=None
-                ),
-                digest=DigestData(
-                    summary=parsed_digest.get("summary", ""),
-                    highlights=parsed_digest.get("highlights", []),
-                    insights=parsed_digest.get("insights", []),
-                    action_items=parsed_digest.get("action_items", []),
-                    questions=parsed_digest.get("questions", [])
-                ),
-                flashcards=FlashcardsData(
-                    flashcards=[Flashcard(**card) for card in flashcard_list],
-                    count=len(flashcard_list)
-                ),
-                metadata=MemoryMetadata(
-                    created_at=datetime.now().isoformat(),
-                    filename=file.filename,
-                    type="audio_ingest"
-                )
-            ),
-            message="Audio processed and stored successfully"
-        )
+async def run_ingest_once(raw_bytes: bytes, upload_filename: Optional[str], idempotency_key: Optional[str],
+                          digest_mode: str = "auto", on_event: Optional[Callable[[str, Any], None]] = None):
+    """
+    Runs the ingest pipeline under an Idempotency-Key and returns the final response.
 
+    Retries with the same key (from /ingest or /ingest/stream, on any worker)
+    attach to the running execution or get its stored response; only the
+    execution that actually runs reports intermediate stages to on_event.
+    """
+    async def execute():
+        async for event, payload in run_ingest(raw_bytes, upload_filename, digest_mode):
+            if event == "result":
+                return payload
+            if on_event is not None:
+                on_event(event, payload)
+
+    request_fingerprint = fingerprint([fingerprint(raw_bytes), digest_mode])
+    return await idempotency.run("ingest", idempotency_key, request_fingerprint, execute)
+
+@app.post("/ingest", response_model=IngestResponse)
+async def ingest(file: UploadFile = File(...), digest_mode: DigestMode = "auto",
+                 idempotency_key: Optional[str] = Header(None)):
+    try:
+        raw_bytes = await file.read()
+
+        return await run_ingest_once(raw_bytes, file.filename, idempotency_key, digest_mode)
+
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(f"ERROR IN INGEST: {str(e)}", flush=True)
         print(traceback.format_exc(), flush=True)
         raise HTTPException(status_code=500, detail=f"Error processing audio: {str(e)}")
 
+# Seconds between SSE comments while a stage runs, so proxies don't drop the idle stream
+SSE_HEARTBEAT_SECONDS = float(os.getenv("RIZQ_SSE_HEARTBEAT_SECONDS", "15"))
+
+def format_sse(event: str, payload) -> str:
+    """Formats one Server-Sent Events message with a JSON body."""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(payload))}\n\n"
+
+@app.post("/ingest/stream")
+async def ingest_stream(file: UploadFile = File(...), digest_mode: DigestMode = "auto",
+                        idempotency_key: Optional[str] = Header(None)):
+    # Read the upload now: the file is closed once this handler returns
+    raw_bytes = await file.read()
+    filename = file.filename
+
+    async def events():
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(
+            run_ingest_once(
+                raw_bytes, filename, idempotency_key, digest_mode,
+                lambda event, payload: queue.put_nowait((event, payload))
+            )
+        )
+        try:
+            # Forward stages until the pipeline finishes (a replayed request only gets the result)
+            while not task.done() or not queue.empty():
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait(
+                    {getter, task}, timeout=SSE_HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED
+                )
+                if getter.done():
+                    event, payload = getter.result()
+                    yield format_sse(event, payload)
+                else:
+                    getter.cancel()
+                    if not done:
+                        # Transcription takes minutes: keep the connection from looking idle
+                        yield ": keep-alive\n\n"
+
+            yield format_sse("result", task.result())
+        except HTTPException as e:
+            yield format_sse("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            import traceback
+            print(f"ERROR IN INGEST STREAM: {str(e)}", flush=True)
+            print(traceback.format_exc(), flush=True)
+            yield format_sse("error", {"status_code": 500, "detail": f"Error processing audio: {str(e)}"})
+        finally:
+            # With a key, let the work finish after a disconnect so the client's retry can pick it up
+            if not idempotency_key:
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def embed(text: str):
+    """Embeds one query (loads the embedding model on first use, so call it off the event loop)."""
+    return db.get_embedding_fn()([text])[0]
+
 @app.post("/search", response_model=SearchResponse)
-async def search(req: dict):
-    # Search disabled in deployment (ChromaDB requires too much memory)
-    raise HTTPException(status_code=503, detail="Search feature temporarily disabled in free tier deployment")
+async def search(req: dict, idempotency_key: Optional[str] = Header(None)):
+    async def generate():
+        # Search disabled in deployment unless the vector store is installed (too memory-heavy for free tier)
+        if not db.vector_available():
+            raise HTTPException(status_code=503, detail="Search feature temporarily disabled in free tier deployment")
+
+        try:
+            query = req.get("query", "")
+
+            if not query:
+                raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+            # Serve a cached answer if a similar question was answered since the last ingest
+            generation = answer_cache.generation
+            query_embedding = await asyncio.to_thread(embed, query)
+            cached = answer_cache.lookup("search", query_embedding)
+            if cached:
+                return SearchResponse(
+                    success=True,
+                    data=SearchResponseData(
+                        answer=cached["answer"],
+                        sources=[SearchSource(**source) for source in cached["extra"]["sources"]],
+                        query=query
+                    ),
+                    message=f"Found {len(cached['source_ids'])} relevant memories (cached)"
+                )
 
-    try:
-        query = req.get("query", "")
+            # Query ChromaDB for relevant documents
+            results = await asyncio.to_thread(
+                lambda: db.get_collection().query(query_embeddings=[query_embedding], n_results=3)
+            )
 
-        if not query:
-            raise HTTPException(status_code=400, detail="Query cannot be empty")
+            matches = results["documents"][0] if results["documents"] else []
+            ids = results["ids"][0] if results["ids"] else []
+            distances = results.get("distances", [[]])[0] if results.get("distances") else []
 
-        # Query ChromaDB for relevant documents
-        # results = collection.query(
-        #     query_texts=[query],
-        #     n_results=3
-        # )
+            # Ask GPT to synthesize the matches into an answer
+            answer_prompt = f"""
+            Based on these notes from the memory database, answer the user's question.
 
-        matches = results["documents"][0] if results["documents"] else []
-        ids = results["ids"][0] if results["ids"] else []
-        distances = results.get("distances", [[]])[0] if results.get("distances") else []
+            QUESTION: {query}
 
-        # Ask GPT to synthesize the matches into an answer
-        answer_prompt = f"""
-        Based on these notes from the memory database, answer the user's question.
+            NOTES:
+            {matches}
 
-        QUESTION: {query}
+            Provide a clear, concise, and helpful answer based on the notes above.
+            If the notes don't contain relevant information, say so.
+            """
 
-        NOTES:
-        {matches}
+            answer_text = await chat_completion(answer_prompt, operation="search")
 
-        Provide a clear, concise, and helpful answer based on the notes above.
-        If the notes don't contain relevant information, say so.
-        """
+            # Build source list
+            sources = []
+            for i, match in enumerate(matches):
+                sources.append(SearchSource(
+                    id=ids[i] if i < len(ids) else f"unknown_{i}",
+                    snippet=match[:300] + "..." if len(match) > 300 else match,
+                    relevance_score=1.0 - distances[i] if i < len(distances) else None
+                ))
 
-        answer = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": answer_prompt}]
-        )
+            answer_cache.store_answer(
+                "search", query_embedding, ids, answer_text, generation,
+                extra={"sources": [source.model_dump() for source in sources]}
+            )
 
-        # Build source list
-        sources = []
-        for i, match in enumerate(matches):
-            sources.append(SearchSource(
-                id=ids[i] if i < len(ids) else f"unknown_{i}",
-                snippet=match[:300] + "..." if len(match) > 300 else match,
-                relevance_score=1.0 - distances[i] if i < len(distances) else None
-            ))
-
-        return SearchResponse(
-            success=True,
-            data=SearchResponseData(
-                answer=answer.choices[0].message.content,
-                sources=sources,
-                query=query
-            ),
-            message=f"Found {len(matches)} relevant memories"
-        )
+            return SearchResponse(
+                success=True,
+                data=SearchResponseData(
+                    answer=answer_text,
+                    sources=sources,
+                    query=query
+                ),
+                message=f"Found {len(matches)} relevant memories"
+            )
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error searching memories: {str(e)}")
+
+    return await idempotency.run("search", idempotency_key, fingerprint(req), generate)
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error searching memories: {str(e)}")
 class ChatRequest(BaseModel):
     message: str
 
 
 @app.post("/chat")
-async def chat(req: ChatRequest):
-    user_message = req.message
+async def chat(req: ChatRequest, idempotency_key: Optional[str] = Header(None)):
+    async def generate():
+        user_message = req.message
+
+        if not db.vector_available():
+            raise HTTPException(status_code=503, detail="Chat feature unavailable: vector store not installed")
+
+        # Serve a cached answer if a similar question was answered since the last ingest
+        generation = answer_cache.generation
+        query_embedding = await asyncio.to_thread(embed, user_message)
+        cached = answer_cache.lookup("chat", query_embedding)
+        if cached:
+            return {
+                "context_used": cached["extra"]["context"],
+                "answer": cached["answer"],
+                "cached": True
+            }
+
+        # 1) Find relevant memories from Chroma
+        results = await asyncio.to_thread(
+            lambda: db.get_collection().query(query_embeddings=[query_embedding], n_results=5)
+        )
 
-    # 1) Find relevant memories from Chroma
-    results = collection.query(
-        query_texts=[user_message],
-        n_results=5
-    )
+        documents = results.get("documents", [[]])
+        context = "\n\n---\n\n".join(documents[0]) if documents and documents[0] else ""
 
-    documents = results.get("documents", [[]])
-    context = "\n\n---\n\n".join(documents[0]) if documents and documents[0] else ""
+        # 2) Build prompt with context
+        prompt = f"""
+    You are Ben's personal AI memory agent.
 
-    # 2) Build prompt with context
-    prompt = f"""
-You are Ben's personal AI memory agent.
+    You have access to his past transcripts, notes, and digests.
 
-You have access to his past transcripts, notes, and digests.
+    CONTEXT (from Ben's memory):
+    {context}
 
-CONTEXT (from Ben's memory):
-{context}
+    USER MESSAGE:
+    {user_message}
 
-USER MESSAGE:
-{user_message}
+    Using ONLY the context when relevant, reply with a concise, helpful answer.
+    If the context doesn't contain anything useful, answer normally but say:
+    "(No relevant past memory found.)"
+    """
 
-Using ONLY the context when relevant, reply with a concise, helpful answer.
-If the context doesn't contain anything useful, answer normally but say:
-"(No relevant past memory found.)"
-"""
+        answer = await chat_completion(prompt, operation="chat")
 
-    completion = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
-    )
+        ids = results.get("ids", [[]])
+        answer_cache.store_answer(
+            "chat", query_embedding, ids[0] if ids else [], answer, generation,
+            extra={"context": context}
+        )
 
-    answer = completion.choices[0].message.content
+        return {
+            "context_used": context,
+            "answer": answer,
+            "cached": False
+        }
 
-    return {
-        "context_used": context,
-        "answer": answer
-    }
+    return await idempotency.run("chat", idempotency_key, fingerprint(req.model_dump()), generate)
@@ -19,6 +19,7 @@ class DigestData(BaseModel):
     insights: List[str]
     action_items: List[str]
     questions: List[str]
+    degraded: bool = False  # True when built locally (extractive) instead of by the LLM
 
 
 class Flashcard(BaseModel):
@@ -38,6 +39,17 @@ class MemoryMetadata(BaseModel):
     created_at: str
     filename: Optional[str] = None
     type: str = "audio_ingest"
+    duplicate_of: Optional[str] = None
+
+
+class AudioProcessingData(BaseModel):
+    """Audio preprocessing statistics"""
+    processed: bool
+    original_size: int
+    processed_size: int
+    bytes_saved: int
+    original_duration: Optional[float] = None
+    processed_duration: Optional[float] = None
 
 
 class IngestResponseData(BaseModel):
@@ -47,6 +59,7 @@ class IngestResponseData(BaseModel):
     digest: DigestData
     flashcards: FlashcardsData
     metadata: MemoryMetadata
+    audio: Optional[AudioProcessingData] = None
 
 
 class IngestResponse(BaseModel):
@@ -120,6 +133,21 @@ class TranscribeResponse(BaseModel):
     message: Optional[str] = None
 
 
+class DocumentResponseData(BaseModel):
+    """Data returned from documents endpoint"""
+    document_id: str
+    filename: Optional[str] = None
+    chunk_count: int
+    word_count: int
+
+
+class DocumentResponse(BaseModel):
+    """Response from /documents endpoint"""
+    success: bool
+    data: DocumentResponseData
+    message: Optional[str] = None
+
+
 class ErrorResponse(BaseModel):
     """Error response format"""
     success: bool = False
@@ -135,9 +163,10 @@ class SmartNotesRequest(BaseModel):
 
 
 class AskRequest(BaseModel):
-    """Request for ask endpoint"""
+    """Request for ask endpoint (send either content or a document_id from /documents)"""
     question: str
-    content: str
+    content: Optional[str] = None
+    document_id: Optional[str] = None
 
 
 class ChatRequest(BaseModel):
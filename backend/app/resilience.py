@@ -0,0 +1,379 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from app.clients import get_async_openai_client
+
+
+# Per-call deadlines (seconds); the upstream request is abandoned after this
+LLM_DEADLINE = float(os.getenv("RIZQ_LLM_DEADLINE_SECONDS", "60"))
+TRANSCRIBE_DEADLINE = float(os.getenv("RIZQ_TRANSCRIBE_DEADLINE_SECONDS", "600"))
+
+# Retries for rate limits and transient errors, with jittered exponential backoff, within the deadline
+MAX_RETRIES = int(os.getenv("RIZQ_UPSTREAM_RETRIES", "2"))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+# Hedging: after the p95 latency, fire one duplicate and take whichever finishes first
+HEDGE_ENABLED = os.getenv("RIZQ_HEDGE", "0") == "1"
+HEDGE_BUDGET = float(os.getenv("RIZQ_HEDGE_BUDGET", "0.05"))  # Max extra calls as a fraction of all calls
+HEDGE_MIN_SAMPLES = 20   # Don't hedge until the p95 estimate means something
+HEDGE_MIN_DELAY = 1.0    # Never hedge sooner than this
+
+# Load shedding: above this many concurrent upstream calls, callers that can degrade should
+SHED_IN_FLIGHT = int(os.getenv("RIZQ_SHED_IN_FLIGHT", "32"))
+
+# Circuit breakers (one per upstream): open when the recent error rate spikes, fail fast during cooldown
+BREAKER_ERROR_RATE = float(os.getenv("RIZQ_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_MIN_CALLS = int(os.getenv("RIZQ_BREAKER_MIN_CALLS", "10"))
+BREAKER_WINDOW = float(os.getenv("RIZQ_BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_COOLDOWN = float(os.getenv("RIZQ_BREAKER_COOLDOWN_SECONDS", "30"))
+
+
+class UpstreamUnavailable(HTTPException):
+    """Raised when the circuit breaker is open or a call misses its deadline"""
+
+
+class LatencyTracker:
+    """Rolling window of successful call durations for one operation"""
+
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Returns the q-th percentile (0-100) of recent durations, or None if empty."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class HedgeBudget:
+    """
+    Token bucket limiting hedges to a fraction of primary calls.
+
+    Every primary call earns `ratio` tokens (capped at `burst`); a hedge spends one.
+    """
+
+    def __init__(self, ratio: float, burst: float = 5.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+        self.calls = 0
+        self.hedges = 0
+
+    def earn(self) -> None:
+        self.calls += 1
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        self.hedges += 1
+        return True
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the upstream is unhealthy.
+
+    Closed: calls go through and outcomes are recorded over a sliding window.
+    Once at least `min_calls` outcomes in the window have an error rate of
+    `error_rate` or more, the breaker opens and rejects calls for `cooldown`
+    seconds. After that a single trial call is let through (half-open): success
+    closes the breaker, failure reopens it.
+
+    allow() hands out a ticket (the admission time) that the caller passes back
+    to record(). Outcomes of calls admitted before the last open/close are
+    ignored, so a slow call that started while the upstream was healthy can't
+    close an open breaker or extend its cooldown.
+    """
+
+    def __init__(self, name: str, error_rate: float, min_calls: int, window: float, cooldown: float):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.outcomes = deque()  # (timestamp, ok)
+        self.opened_at: Optional[float] = None
+        self.changed_at = float("-inf")  # Last time the breaker opened or closed
+        self.trial_started_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> Optional[float]:
+        """
+        Admits a call if the breaker allows it now.
+
+        Returns:
+            Ticket to pass to record() with the call's outcome, or None if rejected
+        """
+        now = time.monotonic()
+        state = self.state
+        if state == "closed":
+            return now
+        if state == "half_open":
+            # One trial at a time; a trial that never reported back (cancelled) expires
+            if self.trial_started_at is None or now - self.trial_started_at >= self.cooldown:
+                self.trial_started_at = now
+                return now
+        return None
+
+    def record(self, ticket: float, ok: bool) -> None:
+        """
+        Records the outcome of a call admitted by allow().
+
+        Args:
+            ticket: Value allow() returned for the call
+            ok: False if the call failed because of the upstream
+        """
+        now = time.monotonic()
+        if ticket < self.changed_at:
+            # Started before the breaker last opened or closed: says nothing about now
+            return
+
+        if self.opened_at is not None:
+            if ticket != self.trial_started_at:
+                return
+            # Result of the half-open trial
+            self.trial_started_at = None
+            self.changed_at = now
+            if ok:
+                self.opened_at = None
+                self.outcomes.clear()
+            else:
+                self.opened_at = now
+            return
+
+        self.outcomes.append((now, ok))
+        while self.outcomes and now - self.outcomes[0][0] > self.window:
+            self.outcomes.popleft()
+
+        failures = sum(1 for _, success in self.outcomes if not success)
+        if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.error_rate:
+            self.opened_at = now
+            self.changed_at = now
+            print(f"Circuit breaker for {self.name} opened: {failures}/{len(self.outcomes)} calls failed", flush=True)
+
+    def retry_after(self) -> int:
+        """Seconds until the breaker will let a trial call through."""
+        if self.opened_at is None:
+            return 0
+        return max(1, int(self.cooldown - (time.monotonic() - self.opened_at)))
+
+
+# Whisper and chat completions fail independently: throttled completions mustn't block transcription
+UPSTREAMS = ("completions", "transcribe")
+breakers = {
+    name: CircuitBreaker(name, BREAKER_ERROR_RATE, BREAKER_MIN_CALLS, BREAKER_WINDOW, BREAKER_COOLDOWN)
+    for name in UPSTREAMS
+}
+in_flight = {name: 0 for name in UPSTREAMS}
+hedge_budget = HedgeBudget(HEDGE_BUDGET)
+latencies: Dict[str, LatencyTracker] = {}
+
+
+def overloaded() -> bool:
+    """Returns True if callers with a local fallback should skip chat completions."""
+    return breakers["completions"].state != "closed" or (
+        SHED_IN_FLIGHT > 0 and in_flight["completions"] >= SHED_IN_FLIGHT
+    )
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Returns True if an error means the upstream is unhealthy.
+
+    Only missed deadlines, an open breaker, connection errors, timeouts, rate
+    limits and 5xx responses count. Our own bad requests and local bugs don't,
+    so they surface as errors instead of being retried or degraded.
+    """
+    if isinstance(error, UpstreamUnavailable):
+        return True
+
+    import openai
+    if isinstance(error, openai.APIConnectionError):  # Includes APITimeoutError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+async def _with_retries(make_call: Callable[[], Awaitable[Any]], give_up_at: float) -> Any:
+    # Replaces the SDK's own retries (disabled so they can't overrun the deadline)
+    for retry in range(MAX_RETRIES + 1):
+        try:
+            return await make_call()
+        except Exception as e:
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** retry) * random.uniform(0.75, 1.0)
+            if retry == MAX_RETRIES or not is_upstream_failure(e) or time.monotonic() + delay >= give_up_at:
+                raise
+            print(f"Upstream call failed ({type(e).__name__}), retrying in {delay:.1f}s", flush=True)
+            await asyncio.sleep(delay)
+
+
+async def call_upstream(operation: str, make_call: Callable[[], Awaitable[Any]],
+                        deadline: float, hedge: bool = True, upstream: str = "completions") -> Any:
+    """
+    Calls the upstream API with a deadline, optional hedging and the circuit breaker.
+
+    Rate limits and transient errors are retried with backoff (up to
+    MAX_RETRIES) as long as the deadline allows.
+
+    Args:
+        operation: Name used to track latency separately per call type (e.g. "ask")
+        make_call: Coroutine function performing one upstream request
+        deadline: Seconds before the call is abandoned
+        hedge: Whether this call may be hedged (only idempotent, cheap calls)
+        upstream: Which circuit breaker guards the call (one of UPSTREAMS)
+
+    Returns:
+        Result of the first attempt to succeed
+
+    Raises:
+        UpstreamUnavailable: 503 if the breaker is open, 504 if the deadline passes
+    """
+    breaker = breakers[upstream]
+    ticket = breaker.allow()
+    if ticket is None:
+        raise UpstreamUnavailable(
+            status_code=503,
+            detail=f"AI service is temporarily unavailable (too many recent failures). Retry in {breaker.retry_after()}s."
+        )
+
+    tracker = latencies.setdefault(operation, LatencyTracker())
+    hedge_budget.earn()
+    start = time.monotonic()
+    in_flight[upstream] += 1
+
+    hedge_delay = None
+    if hedge and HEDGE_ENABLED and len(tracker.samples) >= HEDGE_MIN_SAMPLES:
+        hedge_delay = max(HEDGE_MIN_DELAY, tracker.percentile(95))
+
+    give_up_at = start + deadline
+    attempts = {asyncio.ensure_future(_with_retries(make_call, give_up_at))}
+    last_error: Optional[BaseException] = None
+    try:
+        while attempts:
+            remaining = deadline - (time.monotonic() - start)
+            if remaining <= 0:
+                break
+
+            wait_for = remaining
+            if hedge_delay is not None:
+                wait_for = min(remaining, max(0.0, hedge_delay - (time.monotonic() - start)))
+
+            done, _ = await asyncio.wait(attempts, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+
+            for attempt in done:
+                attempts.discard(attempt)
+                if attempt.exception() is None:
+                    tracker.record(time.monotonic() - start)
+                    breaker.record(ticket, True)
+                    return attempt.result()
+                last_error = attempt.exception()
+
+            if not done and hedge_delay is not None:
+                # Primary is slower than p95: fire one duplicate if the budget allows
+                if hedge_budget.try_spend():
+                    attempts.add(asyncio.ensure_future(_with_retries(make_call, give_up_at)))
+                hedge_delay = None
+            elif not attempts and last_error is not None:
+                # Every attempt failed
+                breaker.record(ticket, not is_upstream_failure(last_error))
+                raise last_error
+    finally:
+        in_flight[upstream] -= 1
+        # Cancel the loser (or everything, on deadline/cancellation)
+        for attempt in attempts:
+            attempt.cancel()
+
+    breaker.record(ticket, False)
+    raise UpstreamUnavailable(
+        status_code=504,
+        detail=f"AI service did not respond within {deadline:.0f}s. Please try again."
+    )
+
+
+async def chat_completion(prompt: str, operation: str, model: str = "gpt-4o-mini",
+                          deadline: float = LLM_DEADLINE) -> str:
+    """
+    Runs a single-message chat completion through call_upstream.
+
+    Args:
+        prompt: User message content
+        operation: Latency-tracking name for this kind of call
+        model: Model name
+        deadline: Seconds before the call is abandoned
+
+    Returns:
+        The completion's message content
+    """
+    client = get_async_openai_client().with_options(timeout=deadline, max_retries=0)
+
+    async def make_call():
+        response = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.choices[0].message.content
+
+    return await call_upstream(operation, make_call, deadline)
+
+
+async def transcribe(file: tuple, deadline: float = TRANSCRIBE_DEADLINE, **kwargs) -> str:
+    """
+    Runs a Whisper transcription with a deadline and the circuit breaker (never hedged).
+
+    Args:
+        file: (filename, bytes) tuple for the upload
+        deadline: Seconds before the call is abandoned
+        **kwargs: Extra transcription parameters (language, prompt, ...)
+
+    Returns:
+        Transcript text
+    """
+    client = get_async_openai_client().with_options(timeout=deadline, max_retries=0)
+
+    async def make_call():
+        transcription = await client.audio.transcriptions.create(
+            model="whisper-1",
+            file=file,
+            **kwargs
+        )
+        return transcription.text
+
+    return await call_upstream("transcribe", make_call, deadline, hedge=False, upstream="transcribe")
+
+
+def stats() -> Dict[str, Any]:
+    """Returns breaker states, hedge usage and p50/p95 latency per operation."""
+    return {
+        "breakers": {name: breaker.state for name, breaker in breakers.items()},
+        "in_flight": dict(in_flight),
+        "overloaded": overloaded(),
+        "hedge_enabled": HEDGE_ENABLED,
+        "calls": hedge_budget.calls,
+        "hedges": hedge_budget.hedges,
+        "latency": {
+            name: {"p50": tracker.percentile(50), "p95": tracker.percentile(95), "samples": len(tracker.samples)}
+            for name, tracker in latencies.items()
+        },
+    }
@@ -0,0 +1,235 @@
+import math
+import re
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, Any, List, Optional
+
+from app.shared import SharedStore
+
+
+# Chunking settings (in words)
+CHUNK_SIZE = 200
+CHUNK_OVERLAP = 40
+
+# BM25 ranking parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Common words that carry no retrieval signal
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "he",
+    "in", "is", "it", "its", "of", "on", "or", "that", "the", "to", "was", "were",
+    "will", "with", "this", "these", "those", "what", "which", "who", "how", "why",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercases text and splits it into indexable word tokens.
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        List of tokens with stopwords removed
+    """
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS]
+
+
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Splits text into overlapping word windows.
+
+    Overlap keeps sentences that straddle a boundary retrievable from either side.
+
+    Args:
+        text: Document text
+        chunk_size: Words per chunk
+        overlap: Words shared between consecutive chunks
+
+    Returns:
+        List of chunk strings (at least one for non-empty text)
+    """
+    words = text.split()
+    if not words:
+        return []
+
+    step = max(1, chunk_size - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_size]))
+        if start + chunk_size >= len(words):
+            break
+    return chunks
+
+
+class DocumentIndex:
+    """BM25 index over the chunks of a single document"""
+
+    def __init__(self, content: str, filename: Optional[str] = None):
+        self.filename = filename
+        self.chunks = chunk_text(content)
+        self.term_counts = [Counter(tokenize(chunk)) for chunk in self.chunks]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+        doc_freq = Counter()
+        for counts in self.term_counts:
+            doc_freq.update(counts.keys())
+        n = len(self.chunks)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+        # Rough resident size: chunk text plus per-term dict overhead
+        self.size_bytes = (
+            sum(len(chunk) for chunk in self.chunks) * 2
+            + sum(len(counts) for counts in self.term_counts) * 100
+            + len(self.idf) * 100
+        )
+
+    def search(self, query: str, top_k: int = 4) -> List[Dict[str, Any]]:
+        """
+        Ranks chunks against a query with BM25.
+
+        Args:
+            query: Question text
+            top_k: Maximum number of chunks to return
+
+        Returns:
+            List of {"index", "text", "score"} dicts for matching chunks, best first.
+            Falls back to the first chunks if nothing matches.
+        """
+        terms = [t for t in tokenize(query) if t in self.idf]
+        scores = []
+        for i, counts in enumerate(self.term_counts):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                tf = counts.get(term, 0)
+                if tf:
+                    score += self.idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            scores.append(score)
+
+        ranked = [i for i in sorted(range(len(self.chunks)), key=lambda i: (-scores[i], i))[:top_k] if scores[i] > 0]
+        if not ranked:
+            ranked = list(range(min(top_k, len(self.chunks))))
+
+        return [{"index": i, "text": self.chunks[i], "score": scores[i]} for i in ranked]
+
+
+class DocumentStore:
+    """
+    In-memory store of indexed documents for multi-question /ask sessions.
+
+    Documents are kept in least-recently-used order. Sessions idle longer than
+    `idle_ttl` seconds are dropped, and the oldest sessions are evicted whenever
+    the total estimated size exceeds `max_bytes`.
+
+    With a shared store, document text is also saved there (expiring after
+    `idle_ttl`, at most `max_documents` kept) so a question routed to a
+    different worker rebuilds the index from it instead of failing. Indexes
+    themselves are per worker, so `max_bytes` is this worker's share of the
+    host's budget.
+    """
+
+    def __init__(self, max_bytes: int, idle_ttl: float, store: Optional[SharedStore] = None,
+                 max_documents: int = 1000):
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.store = store
+        self.max_documents = max_documents
+        self._documents: "OrderedDict[str, DocumentIndex]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._total_bytes = 0
+
+    def add(self, content: str, filename: Optional[str] = None) -> str:
+        """
+        Chunks and indexes a document.
+
+        Args:
+            content: Document text
+            filename: Original upload filename, if any
+
+        Returns:
+            New document id
+        """
+        document_id = str(uuid.uuid4())
+        if self.store is not None:
+            self.store.set("documents", document_id, {"content": content, "filename": filename}, ttl=self.idle_ttl)
+            # Expired rows are only skipped on read; delete them (and the oldest overflow) here
+            self.store.trim("documents", self.max_documents)
+        self._insert(document_id, DocumentIndex(content, filename))
+        return document_id
+
+    def _insert(self, document_id: str, index: DocumentIndex) -> None:
+        self._documents[document_id] = index
+        self._last_used[document_id] = time.monotonic()
+        self._total_bytes += index.size_bytes
+        self._evict()
+
+    def get(self, document_id: str) -> Optional[DocumentIndex]:
+        """
+        Looks up a document and marks it as recently used.
+
+        Args:
+            document_id: Id returned by add()
+
+        Returns:
+            The document index, or None if unknown or evicted
+        """
+        self._evict()
+        index = self._documents.get(document_id)
+        if index is None:
+            # Uploaded via another worker (or evicted here): rebuild from the shared copy
+            saved = self.store.get("documents", document_id) if self.store is not None else None
+            if saved is None:
+                return None
+            index = DocumentIndex(saved["content"], saved["filename"])
+            self._insert(document_id, index)
+        else:
+            self._documents.move_to_end(document_id)
+            self._last_used[document_id] = time.monotonic()
+
+        # Keep the shared copy alive; if it was deleted through another worker, honour that
+        if self.store is not None and not self.store.touch("documents", document_id, ttl=self.idle_ttl):
+            self._drop(document_id)
+            return None
+        return index
+
+    def remove(self, document_id: str) -> bool:
+        """Drops a document session. Returns True if it existed."""
+        existed = self._drop(document_id)
+        if self.store is not None:
+            existed = self.store.delete("documents", document_id) or existed
+        return existed
+
+    def _drop(self, document_id: str) -> bool:
+        index = self._documents.pop(document_id, None)
+        if index is None:
+            return False
+        self._last_used.pop(document_id, None)
+        self._total_bytes -= index.size_bytes
+        return True
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        # Idle sessions first (oldest are at the front)
+        while self._documents:
+            oldest = next(iter(self._documents))
+            if now - self._last_used[oldest] <= self.idle_ttl:
+                break
+            self._drop(oldest)
+        # Then enforce the memory budget, always keeping the newest document
+        while self._total_bytes > self.max_bytes and len(self._documents) > 1:
+            self._drop(next(iter(self._documents)))
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns session count and memory usage."""
+        return {
+            "documents": len(self._documents),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
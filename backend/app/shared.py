@@ -0,0 +1,258 @@
+import fcntl
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, List, Optional
+
+import numpy as np
+
+
+# Directory holding state shared by every uvicorn/gunicorn worker on the host
+SHARED_DIR = os.getenv("RIZQ_SHARED_DIR", os.path.join(tempfile.gettempdir(), "rizq"))
+
+
+class SharedStore:
+    """
+    Cross-process key/value store on SQLite in WAL mode.
+
+    Every worker opens the same database file, so cached values, indexes and
+    invalidation counters are shared instead of duplicated per process. WAL
+    lets readers proceed while a writer commits, and each write is a single
+    transaction, so other workers never see partial updates.
+
+    Values are JSON-encoded, with optional expiry; trim() deletes expired rows
+    and bounds a namespace to its most recently used keys.
+
+    Modules with their own tables (e.g. the LSH indexes) use connection() and
+    transaction() directly on the same database.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.transaction() as conn:
+            # AUTOINCREMENT ids are never reused, so a replaced row always sorts as new
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " expires_at REAL, updated_at REAL NOT NULL,"
+                " UNIQUE (namespace, key))"
+            )
+            # trim() orders a namespace by recency
+            conn.execute("CREATE INDEX IF NOT EXISTS kv_recency ON kv (namespace, updated_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                " name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+
+    def connection(self) -> sqlite3.Connection:
+        """Returns this thread's connection (sqlite3 connections can't be shared across threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Runs the block in one write transaction, rolled back on error."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Returns the stored value, or None if missing or expired."""
+        row = self.connection().execute(
+            "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Stores a value, replacing any existing one.
+
+        Args:
+            namespace: Logical table (e.g. "documents")
+            key: Key within the namespace
+            value: JSON-serializable value
+            ttl: Seconds until the value expires, or None to keep it
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl if ttl else None, now)
+            )
+
+    def add(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """
+        Stores a value only if the key is absent or expired (atomic check-and-set).
+
+        Returns:
+            True if the value was stored, False if a live value already existed
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT expires_at FROM kv WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+            if row is not None and (row[0] is None or row[0] >= now):
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl if ttl else None, now)
+            )
+            return True
+
+    def touch(self, namespace: str, key: str, ttl: Optional[float] = None) -> bool:
+        """
+        Marks a live key as recently used and optionally extends its expiry.
+
+        Returns:
+            False if the key is missing or already expired
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            if ttl:
+                cursor = conn.execute(
+                    "UPDATE kv SET updated_at = ?, expires_at = ? WHERE namespace = ? AND key = ?"
+                    " AND (expires_at IS NULL OR expires_at >= ?)",
+                    (now, now + ttl, namespace, key, now)
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE kv SET updated_at = ? WHERE namespace = ? AND key = ?"
+                    " AND (expires_at IS NULL OR expires_at >= ?)",
+                    (now, namespace, key, now)
+                )
+            return cursor.rowcount > 0
+
+    def delete(self, namespace: str, key: str) -> bool:
+        """Deletes a key. Returns True if it existed."""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            )
+            return cursor.rowcount > 0
+
+    def trim(self, namespace: str, max_items: int) -> List[str]:
+        """
+        Deletes expired keys, then the least recently used beyond `max_items`.
+
+        Returns:
+            Keys that were deleted
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            removed = [row[0] for row in conn.execute(
+                "SELECT key FROM kv WHERE namespace = ? AND expires_at < ?",
+                (namespace, now)
+            )]
+            conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND expires_at < ?",
+                (namespace, now)
+            )
+            overflow = [row[0] for row in conn.execute(
+                "SELECT key FROM kv WHERE namespace = ? ORDER BY updated_at DESC LIMIT -1 OFFSET ?",
+                (namespace, max_items)
+            )]
+            conn.executemany(
+                "DELETE FROM kv WHERE namespace = ? AND key = ?",
+                [(namespace, key) for key in overflow]
+            )
+        return removed + overflow
+
+    def counter(self, name: str) -> int:
+        """Returns a shared counter's value (0 if never incremented)."""
+        row = self.connection().execute(
+            "SELECT value FROM counters WHERE name = ?", (name,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def increment(self, name: str) -> int:
+        """
+        Atomically increments a shared counter and returns the new value.
+
+        Used both for unique ids and as a generation number: bumping it tells
+        every worker that data derived before the bump is stale.
+        """
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO counters (name, value) VALUES (?, 1)"
+                " ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                (name,)
+            )
+            return conn.execute(
+                "SELECT value FROM counters WHERE name = ?", (name,)
+            ).fetchone()[0]
+
+
+class MappedArray:
+    """
+    NumPy array file written atomically and memory-mapped read-only by readers.
+
+    Every worker maps the same file, so the OS page cache holds one copy no
+    matter how many workers there are. Writers build the new file next to the
+    old one and rename it into place; readers notice the new inode and remap.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._array = None
+        self._identity = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @contextmanager
+    def locked(self):
+        """Serializes read-modify-write cycles across processes."""
+        with open(self.path + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read(self) -> Optional[np.ndarray]:
+        """Returns the current array (memory-mapped), or None if never written."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._array, self._identity = None, None
+            return None
+
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity != self._identity:
+            self._array = np.load(self.path, mmap_mode="r")
+            self._identity = identity
+        return self._array
+
+    def write(self, array: np.ndarray) -> None:
+        """Atomically replaces the file contents."""
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npy.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
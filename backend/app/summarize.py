@@ -0,0 +1,136 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Any, List
+
+import numpy as np
+
+from app.sessions import tokenize
+
+
+MAX_SENTENCES = 1500    # Keeps the sentence-similarity matrix small on very long lectures
+MAX_VOCABULARY = 3000   # Most document-frequent terms kept for TF-IDF
+DAMPING = 0.85          # TextRank / PageRank damping factor
+
+# Phrases that usually mark something the listener is told to do
+ACTION_CUES = re.compile(
+    r"\b(you should|you need to|make sure|remember to|don't forget|be sure to|homework|assignment|"
+    r"read chapter|due (on|by|next)|for next (class|week|time)|we will|we'll)\b",
+    re.IGNORECASE
+)
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Splits a transcript into sentences, dropping fragments too short to summarize.
+
+    Args:
+        text: Cleaned transcript text
+
+    Returns:
+        List of sentences in document order
+    """
+    sentences = re.split(r"(?<=[.!?])\s+", text.strip())
+    return [s.strip() for s in sentences if len(s.split()) >= 4]
+
+
+def rank_sentences(sentences: List[str]) -> np.ndarray:
+    """
+    Scores sentences by TextRank centrality over TF-IDF vectors.
+
+    Args:
+        sentences: Sentences in document order
+
+    Returns:
+        Array of scores aligned with `sentences` (higher is more central)
+    """
+    n = len(sentences)
+    if n <= 2:
+        return np.ones(n)
+
+    tokens = [tokenize(s) for s in sentences]
+    doc_freq = Counter(term for terms in tokens for term in set(terms))
+    vocabulary = {term: i for i, (term, _) in enumerate(doc_freq.most_common(MAX_VOCABULARY))}
+
+    tf = np.zeros((n, len(vocabulary)), dtype=np.float32)
+    for row, terms in enumerate(tokens):
+        for term, count in Counter(terms).items():
+            column = vocabulary.get(term)
+            if column is not None:
+                tf[row, column] = count
+
+    idf = np.array([math.log((1 + n) / (1 + doc_freq[t])) + 1 for t in vocabulary], dtype=np.float32)
+    vectors = tf * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1, norms)
+
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, 0.0)
+    row_sums = similarity.sum(axis=1, keepdims=True)
+    transition = similarity / np.where(row_sums == 0, 1, row_sums)
+
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(100):
+        updated = (1 - DAMPING) / n + DAMPING * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < 1e-6:
+            scores = updated
+            break
+        scores = updated
+    return scores
+
+
+def _top_terms(sentences: List[str], count: int) -> List[str]:
+    counts = Counter(term for s in sentences for term in tokenize(s) if len(term) > 3 and not term.isdigit())
+    return [term for term, _ in counts.most_common(count)]
+
+
+def _clip(sentence: str, limit: int = 220) -> str:
+    return sentence if len(sentence) <= limit else sentence[:limit].rsplit(" ", 1)[0] + "..."
+
+
+def extractive_digest(text: str) -> Dict[str, Any]:
+    """
+    Builds a digest from the transcript alone, without calling the LLM.
+
+    Used when the upstream is overloaded or down. Sentences are ranked with
+    TextRank; the most central form the summary and highlights, and action
+    items and questions are picked out with simple cues.
+
+    Args:
+        text: Cleaned transcript text
+
+    Returns:
+        Digest dictionary with the same fields as extract_structured_digest()
+    """
+    sentences = split_sentences(text)[:MAX_SENTENCES]
+    if not sentences:
+        return {
+            "summary": text.strip()[:500],
+            "highlights": [],
+            "insights": [],
+            "action_items": [],
+            "questions": []
+        }
+
+    scores = rank_sentences(sentences)
+    ranked = [int(i) for i in np.argsort(-scores, kind="stable")]
+
+    summary_ids = sorted(ranked[:3])
+    highlights = [_clip(sentences[i]) for i in ranked[:5]]
+    insights = [_clip(sentences[i]) for i in ranked[5:8]]
+
+    action_items = [_clip(sentences[i]) for i in ranked if ACTION_CUES.search(sentences[i])][:5]
+
+    questions = [_clip(sentences[i]) for i in ranked if sentences[i].endswith("?")][:5]
+    for term in _top_terms(sentences, 5):
+        if len(questions) >= 3:
+            break
+        questions.append(f"What does the lecture say about {term}?")
+
+    return {
+        "summary": " ".join(sentences[i] for i in summary_ids),
+        "highlights": highlights,
+        "insights": insights,
+        "action_items": action_items,
+        "questions": questions
+    }
@@ -350,3 +350,19 @@ def remove_hallucinations(text: str) -> str:
         print(f"Removed hallucinations: reduced text from {original_length} to {len(text)} chars", flush=True)
 
     return text
+
+
+def clean_transcript(text: str) -> str:
+    """
+    Runs the full Whisper post-processing pipeline on a transcript.
+
+    Module-level so it can be dispatched to the CPU worker pool.
+
+    Args:
+        text: Raw transcript text
+
+    Returns:
+        Transcript with hallucinations and repetitive endings removed
+    """
+    text = remove_hallucinations(text)
+    return remove_repetitive_endings(text)
@@ -0,0 +1,163 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Tuple, Union
+
+
+# Worker processes for CPU-bound text processing (defaults to one per core)
+POOL_SIZE = int(os.getenv("RIZQ_CPU_WORKERS", "0")) or (os.cpu_count() or 1)
+
+# Texts shorter than this are processed inline: pool dispatch costs more than the work
+INLINE_THRESHOLD = int(os.getenv("RIZQ_CPU_INLINE_CHARS", "20000"))
+
+# Texts larger than this travel through shared memory instead of being pickled through a pipe
+SHM_THRESHOLD = int(os.getenv("RIZQ_CPU_SHM_BYTES", str(1024 * 1024)))
+
+_lock = threading.Lock()
+_pool = None
+_pending = 0
+_stats = {"inline": 0, "offloaded": 0, "shared_memory": 0, "pool_restarts": 0}
+
+# A str, or (shared memory block name, byte length) for large strings
+Payload = Union[str, Tuple[str, int]]
+
+
+def _to_payload(text: str) -> Payload:
+    data = text.encode("utf-8")
+    if len(data) < SHM_THRESHOLD:
+        return text
+    block = shared_memory.SharedMemory(create=True, size=len(data))
+    block.buf[:len(data)] = data
+    name = block.name
+    block.close()
+    return (name, len(data))
+
+
+def _from_payload(payload: Payload, unlink: bool) -> str:
+    if isinstance(payload, str):
+        return payload
+    name, size = payload
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(block.buf[:size]).decode("utf-8")
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+
+
+def _release(payload: Payload) -> None:
+    if isinstance(payload, str):
+        return
+    try:
+        block = shared_memory.SharedMemory(name=payload[0])
+        block.close()
+        block.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _run_in_worker(func: Callable[..., Any], payload: Payload, args: tuple) -> Any:
+    # Runs inside the worker process; the parent owns (and unlinks) the input block
+    result = func(_from_payload(payload, unlink=False), *args)
+    if isinstance(result, str):
+        return ("text", _to_payload(result))
+    return ("value", result)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Returns the shared process pool, starting it on first use."""
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                # Never fork the server: it already runs threads (warm-up, threadpool, SQLite)
+                # whose locks a forked child could inherit held. Tasks are module-level, so
+                # forkserver/spawn children just import them.
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                _pool = ProcessPoolExecutor(max_workers=POOL_SIZE, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+def _reset_pool(broken: ProcessPoolExecutor) -> None:
+    # A worker died (OOM kill, segfault): the executor is unusable from now on, replace it
+    global _pool
+    with _lock:
+        if _pool is broken:
+            _pool = None
+            _stats["pool_restarts"] += 1
+            broken.shutdown(wait=False, cancel_futures=True)
+            print("CPU worker pool broke, restarting it", flush=True)
+
+
+async def run_text_task(func: Callable[..., Any], text: str, *args) -> Any:
+    """
+    Runs a CPU-bound function of a string without blocking the event loop.
+
+    Small inputs run inline. Larger ones are dispatched to the process pool,
+    which sidesteps the GIL; very large strings are passed through shared
+    memory rather than pickled. `func` must be a module-level function.
+
+    If a pool worker dies, the pool is restarted and the task retried once.
+
+    Args:
+        func: Function taking the text as its first argument
+        text: Input text
+        *args: Extra positional arguments for func
+
+    Returns:
+        Whatever func returns
+    """
+    global _pending
+    if not text or len(text) < INLINE_THRESHOLD:
+        _stats["inline"] += 1
+        return func(text, *args)
+
+    payload = _to_payload(text)
+    if not isinstance(payload, str):
+        _stats["shared_memory"] += 1
+
+    _stats["offloaded"] += 1
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            pool = get_pool()
+            try:
+                kind, result = await loop.run_in_executor(pool, _run_in_worker, func, payload, args)
+                break
+            except BrokenProcessPool:
+                _reset_pool(pool)
+                # Don't retry inline: a task that kills workers would take down the server
+                if attempt == 1:
+                    raise
+    finally:
+        _pending -= 1
+        _release(payload)
+
+    if kind == "text":
+        return _from_payload(result, unlink=True)
+    return result
+
+
+def stats() -> Dict[str, Any]:
+    """Returns pool size, queue depth (tasks submitted but not finished) and dispatch counters."""
+    return {
+        "pool_size": POOL_SIZE,
+        "started": _pool is not None,
+        "pending": _pending,
+        **_stats,
+    }
+
+
+def shutdown() -> None:
+    """Stops the worker processes if the pool was started."""
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
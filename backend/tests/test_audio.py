@@ -0,0 +1,92 @@
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.audio import TARGET_SAMPLE_RATE, ffmpeg_available, decode_to_pcm, preprocess_audio, trim_silence
+
+
+SAMPLE_M4A = Path(__file__).resolve().parents[2] / "Audiotester.m4a"
+
+requires_ffmpeg = pytest.mark.skipif(not ffmpeg_available(), reason="ffmpeg not on PATH")
+
+rng = np.random.default_rng(0)
+
+
+def tone(seconds: float, dbfs: float) -> np.ndarray:
+    """Noise-like signal standing in for speech at a given RMS level."""
+    rms = 32768.0 * 10 ** (dbfs / 20)
+    samples = rng.normal(0.0, rms, int(seconds * TARGET_SAMPLE_RATE))
+    return np.clip(samples, -32768, 32767).astype(np.int16)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * TARGET_SAMPLE_RATE), dtype=np.int16)
+
+
+def duration(samples: np.ndarray) -> float:
+    return len(samples) / TARGET_SAMPLE_RATE
+
+
+def test_trim_keeps_quiet_speech_around_a_loud_burst():
+    # Phone far from the lecturer, with one loud moment (door, cough, applause)
+    samples = np.concatenate((tone(60, -44), tone(2, -10), tone(60, -44)))
+
+    assert duration(trim_silence(samples)) == pytest.approx(122, abs=0.1)
+
+
+def test_trim_keeps_short_pauses():
+    speech = [tone(2, -25), silence(0.3)] * 10
+    samples = np.concatenate(speech)
+
+    assert duration(trim_silence(samples)) == pytest.approx(duration(samples), abs=0.05)
+
+
+def test_trim_cuts_long_silences():
+    samples = np.concatenate((tone(5, -25), silence(10), tone(5, -25), silence(10), tone(5, -25)))
+    trimmed = duration(trim_silence(samples))
+
+    # 15s of speech plus a little padding either side of each cut
+    assert 15 <= trimmed < 16.5
+
+
+def test_trim_cuts_room_noise_between_quiet_speech():
+    samples = np.concatenate((tone(10, -44), tone(10, -70), tone(10, -44)))
+
+    assert duration(trim_silence(samples)) == pytest.approx(20, abs=0.6)
+
+
+def test_trim_of_pure_silence_is_empty():
+    assert len(trim_silence(silence(5))) == 0
+
+
+@requires_ffmpeg
+def test_decodes_m4a_with_index_at_end():
+    # Phone recordings put the moov atom last; decoding must seek, not read a pipe
+    samples = decode_to_pcm(SAMPLE_M4A.read_bytes())
+
+    assert samples.dtype == np.int16
+    assert len(samples) > 0
+
+
+@requires_ffmpeg
+def test_preprocess_shrinks_checked_in_m4a():
+    audio_bytes = SAMPLE_M4A.read_bytes()
+    result = preprocess_audio(audio_bytes, SAMPLE_M4A.name)
+
+    assert result["processed"] is True
+    assert result["original_duration"] > 10
+    assert 0 < result["processed_duration"] <= result["original_duration"]
+    assert result["processed_size"] < len(audio_bytes)
+    assert result["filename"] == "Audiotester.mp3"
+
+
+@requires_ffmpeg
+def test_undecodable_upload_is_passed_through():
+    garbage = b"not really audio" * 64
+    result = preprocess_audio(garbage, "broken.m4a")
+
+    assert result["processed"] is False
+    assert result["audio_bytes"] == garbage
+    assert result["filename"] == "broken.m4a"
@@ -0,0 +1,62 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from app.dedup import LSHIndex, drop_duplicate_flashcards, transcript_signature
+from app.shared import SharedStore
+
+
+LECTURE = (
+    "Today we are going to look at how enzymes lower the activation energy of a reaction. "
+    "An enzyme binds its substrate at the active site and stabilises the transition state. "
+    "Temperature and pH change the shape of the active site, which is why enzymes denature. "
+    "Competitive inhibitors bind the active site while non-competitive inhibitors bind elsewhere."
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SharedStore(str(tmp_path / "state.sqlite3"))
+
+
+def test_empty_or_short_transcripts_have_no_signature():
+    assert transcript_signature("") is None
+    assert transcript_signature("...") is None
+    assert transcript_signature("thank you") is None
+    assert transcript_signature(LECTURE) is not None
+
+
+def test_near_duplicate_transcript_matches_across_indexes(store):
+    writer = LSHIndex(store=store, namespace="lsh:transcripts", threshold=0.85)
+    reader = LSHIndex(store=store, namespace="lsh:transcripts", threshold=0.85)
+    writer.add("memory-1", transcript_signature(LECTURE), {"digest": "d"})
+
+    match = reader.best_match(transcript_signature(LECTURE + " Any questions?"))
+
+    assert match is not None
+    assert match[0] == "memory-1"
+    assert match[2] == {"digest": "d"}
+    unrelated = (
+        "This week covers the causes of the First World War, from the alliance system and "
+        "militarism to the assassination in Sarajevo and the July crisis that followed it."
+    )
+    assert reader.best_match(transcript_signature(unrelated)) is None
+
+
+def test_index_is_trimmed_to_max_items(store):
+    index = LSHIndex(store=store, namespace="lsh:small", threshold=0.85, max_items=2)
+    texts = [f"{LECTURE} Part {word} of the series." for word in ("one", "two", "three")]
+    for i, text in enumerate(texts):
+        index.add(f"m{i}", transcript_signature(text), i)
+
+    assert len(index) == 2
+
+
+def test_duplicate_flashcards_are_dropped_within_and_across_batches(store):
+    index = LSHIndex(store=store, namespace="lsh:flashcards", threshold=0.8)
+    card = {"front": "What lowers activation energy?", "back": "An enzyme stabilising the transition state"}
+    other = {"front": "What do competitive inhibitors bind?", "back": "The enzyme's active site"}
+
+    assert drop_duplicate_flashcards([card, dict(card), other], index, "m1") == [card, other]
+    assert drop_duplicate_flashcards([dict(card)], index, "m2") == []
+    assert len(index) == 2
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("numpy")
+
+from fastapi import HTTPException
+
+from app.idempotency import IdempotencyStore, fingerprint
+from app.shared import SharedStore
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SharedStore(str(tmp_path / "state.sqlite3"))
+
+
+@pytest.fixture
+def store(shared):
+    return IdempotencyStore(shared, poll_interval=0.01)
+
+
+def counting(result, delay: float = 0.0):
+    calls = []
+
+    async def func():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result
+
+    return func, calls
+
+
+def test_fingerprint_ignores_key_order_but_not_values():
+    assert fingerprint({"a": 1, "b": 2}) == fingerprint({"b": 2, "a": 1})
+    assert fingerprint({"a": 1}) != fingerprint({"a": 2})
+    assert fingerprint(b"audio") == fingerprint(bytearray(b"audio"))
+
+
+def test_without_a_key_every_request_runs(store):
+    func, calls = counting({"answer": 1})
+
+    async def run():
+        await store.run("ask", None, "f", func)
+        await store.run("ask", None, "f", func)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_completed_request_is_replayed(store):
+    func, calls = counting({"answer": 42})
+
+    async def run():
+        first = await store.run("ask", "key-1", "f", func)
+        second = await store.run("ask", "key-1", "f", func)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second == {"answer": 42}
+    assert len(calls) == 1
+    assert store.stats()["replayed"] == 1
+
+
+def test_concurrent_retry_attaches_to_the_running_execution(store):
+    func, calls = counting({"answer": "slow"}, delay=0.05)
+
+    async def run():
+        return await asyncio.gather(
+            store.run("ingest", "key-1", "f", func),
+            store.run("ingest", "key-1", "f", func),
+        )
+
+    assert asyncio.run(run()) == [{"answer": "slow"}, {"answer": "slow"}]
+    assert len(calls) == 1
+
+
+def test_retry_on_another_worker_waits_for_the_stored_response(shared):
+    first_worker = IdempotencyStore(shared, poll_interval=0.01)
+    second_worker = IdempotencyStore(shared, poll_interval=0.01)
+    func, calls = counting({"answer": "done"}, delay=0.05)
+
+    async def run():
+        original = asyncio.create_task(first_worker.run("ingest", "key-1", "f", func))
+        await asyncio.sleep(0.01)
+        retry = await second_worker.run("ingest", "key-1", "f", func)
+        return await original, retry
+
+    assert asyncio.run(run()) == ({"answer": "done"}, {"answer": "done"})
+    assert len(calls) == 1
+
+
+def test_reused_key_with_a_different_request_is_rejected(store):
+    func, _ = counting({"answer": 1})
+
+    async def run():
+        await store.run("ask", "key-1", fingerprint({"q": "a"}), func)
+        await store.run("ask", "key-1", fingerprint({"q": "b"}), func)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 422
+
+
+def test_failures_are_not_recorded(store):
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("upstream down")
+        return {"answer": "ok"}
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await store.run("ask", "key-1", "f", flaky)
+        return await store.run("ask", "key-1", "f", flaky)
+
+    assert asyncio.run(run()) == {"answer": "ok"}
+    assert len(attempts) == 2
+    assert store.stats()["in_flight"] == 0
+
+
+def test_same_key_on_different_endpoints_does_not_collide(store):
+    ask, ask_calls = counting({"answer": "ask"})
+    digest, digest_calls = counting({"digest": "digest"})
+
+    async def run():
+        return (
+            await store.run("ask", "key-1", "f", ask),
+            await store.run("digest", "key-1", "f", digest),
+        )
+
+    assert asyncio.run(run()) == ({"answer": "ask"}, {"digest": "digest"})
+    assert len(ask_calls) == len(digest_calls) == 1
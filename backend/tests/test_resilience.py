@@ -0,0 +1,234 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from app import resilience
+from app.resilience import CircuitBreaker, HedgeBudget, UpstreamUnavailable
+
+
+class RateLimited(Exception):
+    """Stands in for openai.RateLimitError without needing an HTTP response."""
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(resilience, "breakers", {
+        name: CircuitBreaker(name, error_rate=0.5, min_calls=4, window=60, cooldown=0.05)
+        for name in resilience.UPSTREAMS
+    })
+    monkeypatch.setattr(resilience, "in_flight", {name: 0 for name in resilience.UPSTREAMS})
+    monkeypatch.setattr(resilience, "hedge_budget", HedgeBudget(1.0))
+    monkeypatch.setattr(resilience, "latencies", {})
+    monkeypatch.setattr(resilience, "RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(resilience, "HEDGE_ENABLED", False)
+    original = resilience.is_upstream_failure
+    monkeypatch.setattr(
+        resilience, "is_upstream_failure",
+        lambda error: isinstance(error, RateLimited) or original(error)
+    )
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.min_calls):
+        breaker.record(breaker.allow(), False)
+    assert breaker.state == "open"
+
+
+def test_breaker_opens_on_error_rate_and_rejects():
+    breaker = CircuitBreaker("test", error_rate=0.5, min_calls=4, window=60, cooldown=60)
+    breaker.record(breaker.allow(), True)
+    breaker.record(breaker.allow(), False)
+    breaker.record(breaker.allow(), True)
+    assert breaker.state == "closed"
+
+    breaker.record(breaker.allow(), False)
+
+    assert breaker.state == "open"
+    assert breaker.allow() is None
+    assert breaker.retry_after() >= 1
+
+
+def test_half_open_admits_one_trial_which_closes_on_success():
+    breaker = CircuitBreaker("test", error_rate=0.5, min_calls=4, window=60, cooldown=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+
+    assert breaker.state == "half_open"
+    trial = breaker.allow()
+    assert trial is not None
+    assert breaker.allow() is None
+
+    breaker.record(trial, True)
+    assert breaker.state == "closed"
+    assert breaker.allow() is not None
+
+
+def test_failed_trial_reopens_for_a_full_cooldown():
+    breaker = CircuitBreaker("test", error_rate=0.5, min_calls=4, window=60, cooldown=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+
+    breaker.record(breaker.allow(), False)
+
+    assert breaker.state == "open"
+    assert breaker.allow() is None
+
+
+def test_stale_tickets_do_not_change_an_open_breaker():
+    breaker = CircuitBreaker("test", error_rate=0.5, min_calls=4, window=60, cooldown=60)
+    slow_call = breaker.allow()
+    open_breaker(breaker)
+    opened_at = breaker.opened_at
+
+    # A call admitted before the breaker opened finishes during the cooldown
+    breaker.record(slow_call, True)
+    assert breaker.state == "open"
+
+    breaker.record(slow_call, False)
+    assert breaker.opened_at == opened_at
+
+
+def test_stale_trial_is_ignored_after_a_new_trial_starts():
+    breaker = CircuitBreaker("test", error_rate=0.5, min_calls=4, window=60, cooldown=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+    abandoned = breaker.allow()
+    time.sleep(0.06)
+    trial = breaker.allow()
+    assert trial is not None and trial != abandoned
+
+    breaker.record(abandoned, True)
+    assert breaker.state == "half_open"
+
+    breaker.record(trial, True)
+    assert breaker.state == "closed"
+
+
+def test_hedge_budget_caps_hedges_at_ratio_and_burst():
+    budget = HedgeBudget(ratio=0.05, burst=2.0)
+    spent = 0
+    for _ in range(100):
+        budget.earn()
+        spent += budget.try_spend()
+    assert spent == 5
+
+    idle = HedgeBudget(ratio=0.5, burst=2.0)
+    for _ in range(100):
+        idle.earn()
+    assert sum(idle.try_spend() for _ in range(10)) == 2
+
+
+def test_deadline_returns_504_and_counts_as_failure():
+    async def hang():
+        await asyncio.sleep(10)
+
+    with pytest.raises(UpstreamUnavailable) as error:
+        asyncio.run(resilience.call_upstream("ask", hang, deadline=0.05))
+
+    assert error.value.status_code == 504
+    assert list(resilience.breakers["completions"].outcomes)[-1][1] is False
+    assert resilience.in_flight["completions"] == 0
+
+
+def test_open_breaker_fails_fast_with_503():
+    open_breaker(resilience.breakers["completions"])
+    calls = []
+
+    async def call():
+        calls.append(1)
+
+    with pytest.raises(UpstreamUnavailable) as error:
+        asyncio.run(resilience.call_upstream("ask", call, deadline=1))
+
+    assert error.value.status_code == 503
+    assert calls == []
+
+
+def test_completions_outage_does_not_block_transcription():
+    open_breaker(resilience.breakers["completions"])
+
+    async def transcribe():
+        return "transcript"
+
+    assert resilience.overloaded()
+    result = asyncio.run(resilience.call_upstream("transcribe", transcribe, 1, hedge=False, upstream="transcribe"))
+    assert result == "transcript"
+
+
+def test_transient_errors_are_retried_within_the_deadline():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimited()
+        return "ok"
+
+    assert asyncio.run(resilience.call_upstream("ask", flaky, deadline=5)) == "ok"
+    assert len(attempts) == 3
+
+
+def test_local_errors_are_not_retried_or_counted():
+    attempts = []
+
+    async def broken():
+        attempts.append(1)
+        raise ValueError("bug")
+
+    with pytest.raises(ValueError):
+        asyncio.run(resilience.call_upstream("ask", broken, deadline=5))
+
+    assert len(attempts) == 1
+    assert list(resilience.breakers["completions"].outcomes)[-1][1] is True
+
+
+def test_slow_call_is_hedged_and_loser_cancelled(monkeypatch):
+    monkeypatch.setattr(resilience, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(resilience, "HEDGE_MIN_DELAY", 0.01)
+    tracker = resilience.latencies.setdefault("ask", resilience.LatencyTracker())
+    for _ in range(resilience.HEDGE_MIN_SAMPLES):
+        tracker.record(0.01)
+
+    started = []
+    cancelled = []
+
+    async def call():
+        attempt = len(started)
+        started.append(attempt)
+        try:
+            await asyncio.sleep(5 if attempt == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return attempt
+
+    async def run():
+        result = await resilience.call_upstream("ask", call, deadline=2)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == 1
+    assert cancelled == [0]
+    assert resilience.hedge_budget.hedges == 1
+
+
+def test_chat_completion_uses_the_client_with_sdk_retries_off(monkeypatch):
+    options = {}
+
+    async def create(model, messages):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"echo: {messages[0]['content']}"))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    def with_options(**kwargs):
+        options.update(kwargs)
+        return client
+
+    monkeypatch.setattr(resilience, "get_async_openai_client", lambda: SimpleNamespace(with_options=with_options))
+
+    assert asyncio.run(resilience.chat_completion("hi", operation="ask", deadline=3)) == "echo: hi"
+    assert options == {"timeout": 3, "max_retries": 0}
@@ -11,6 +11,7 @@ function App() {
   const [ingestData, setIngestData] = useState(null);
   const [searchData, setSearchData] = useState(null);
   const [error, setError] = useState(null);
+  const [stage, setStage] = useState(null);
 
   async function handleUpload() {
     if (!file) return;
@@ -19,40 +20,93 @@ function App() {
     setError(null);
     setIngestData(null);
     setSearchData(null);
+    setStage("transcript");
 
-    try {
-      const formData = new FormData();
-      formData.append("file", file);
-
-      // Increased timeout for long audio files (up to 20 minutes)
-      const controller = new AbortController();
-      const timeoutId = setTimeout(() => controller.abort(), 20 * 60 * 1000); // 20 minutes
-
-      const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
-      const res = await fetch(`${API_URL}/ingest`, {
-        method: "POST",
-        body: formData,
-        signal: controller.signal
-      });
-
-      clearTimeout(timeoutId);
+    // Same key on every attempt: a retry after a dropped stream attaches to the running job
+    const idempotencyKey = crypto.randomUUID();
+    const MAX_ATTEMPTS = 3;
 
-      if (!res.ok) {
-        throw new Error(`Upload failed: ${res.statusText}`);
-      }
+    // Increased timeout for long audio files (up to 20 minutes)
+    const controller = new AbortController();
+    const timeoutId = setTimeout(() => controller.abort(), 20 * 60 * 1000); // 20 minutes
 
-      const data = await res.json();
-
-      if (data.success) {
-        setIngestData(data.data);
-      } else {
-        throw new Error(data.message || "Upload failed");
+    try {
+      for (let attempt = 1; ; attempt++) {
+        try {
+          if (await streamIngest(idempotencyKey, controller.signal)) break;
+          throw new TypeError("connection closed before processing finished");
+        } catch (err) {
+          // Only network drops are retried; server errors and the timeout are final
+          if (!(err instanceof TypeError) || controller.signal.aborted || attempt >= MAX_ATTEMPTS) {
+            throw err.name === "TypeError" ? new Error(`Upload failed: ${err.message}`) : err;
+          }
+          console.warn(`Ingest stream dropped, reconnecting (attempt ${attempt + 1})`, err);
+          await new Promise((resolve) => setTimeout(resolve, 2000 * attempt));
+        }
       }
     } catch (err) {
       setError(err.message);
       console.error("Upload error:", err);
     } finally {
+      clearTimeout(timeoutId);
       setLoading(false);
+      setStage(null);
+    }
+  }
+
+  // Streams one /ingest/stream attempt; returns true once the final result arrives
+  async function streamIngest(idempotencyKey, signal) {
+    const formData = new FormData();
+    formData.append("file", file);
+
+    const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
+    const res = await fetch(`${API_URL}/ingest/stream`, {
+      method: "POST",
+      headers: { "Idempotency-Key": idempotencyKey },
+      body: formData,
+      signal
+    });
+
+    if (!res.ok) {
+      throw new Error(`Upload failed: ${res.statusText}`);
+    }
+
+    // Render each stage as soon as the server finishes it
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) return false;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+        const message = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        // Keep-alive comments (": ...") carry no event
+        const event = message.match(/^event: (.*)$/m)?.[1];
+        const dataLine = message.match(/^data: (.*)$/m)?.[1];
+        if (!event || !dataLine) continue;
+        const data = JSON.parse(dataLine);
+
+        if (event === "transcript") {
+          setIngestData({ transcript: data.transcript, metadata: data.metadata });
+          setStage("digest");
+        } else if (event === "digest") {
+          setIngestData((prev) => ({ ...prev, digest: data }));
+          setStage("flashcards");
+        } else if (event === "flashcards") {
+          setIngestData((prev) => ({ ...prev, flashcards: data }));
+        } else if (event === "result") {
+          setIngestData(data.data);
+          return true;
+        } else if (event === "error") {
+          throw new Error(data.detail || "Upload failed");
+        }
+      }
     }
   }
 
@@ -174,7 +228,9 @@ function App() {
             margin: "0 auto 20px"
           }}></div>
           <div style={{ fontSize: "18px", marginBottom: "12px", fontWeight: "600" }}>
-            🎧 Processing your audio...
+            {stage === "digest" && "📝 Transcript ready, writing the digest..."}
+            {stage === "flashcards" && "🃏 Digest ready, generating flashcards..."}
+            {(!stage || stage === "transcript") && "🎧 Processing your audio..."}
           </div>
           <div style={{ fontSize: "14px", color: "#666", maxWidth: "500px", margin: "0 auto", lineHeight: "1.6" }}>
             {file && file.size > 5000000 && (
@@ -194,15 +250,17 @@ function App() {
         </div>
       )}
 
-      {/* Ingest Results */}
-      {ingestData && !loading && (
+      {/* Ingest Results (streamed in as each stage finishes) */}
+      {ingestData && (
         <>
-          <TranscriptCard
-            transcript={ingestData.transcript}
-            metadata={ingestData.metadata}
-          />
-          <ResultCard digest={ingestData.digest} />
-          <FlashcardGrid flashcardsData={ingestData.flashcards} />
+          {ingestData.transcript && (
+            <TranscriptCard
+              transcript={ingestData.transcript}
+              metadata={ingestData.metadata}
+            />
+          )}
+          {ingestData.digest && <ResultCard digest={ingestData.digest} />}
+          {ingestData.flashcards && <FlashcardGrid flashcardsData={ingestData.flashcards} />}
         </>
       )}
 